@@ -4,13 +4,13 @@ Handles Firebase authentication, JWT tokens, and user session management.
 """
 
 import logging
-from datetime import datetime, timezone
-from typing import Optional
+from typing import Annotated, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer
-from pydantic import BaseModel, EmailStr, validator
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, EmailStr, StringConstraints
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.auth import (
     create_access_token,
@@ -19,35 +19,35 @@ from core.auth import (
     verify_jwt_token,
     get_current_user,
     get_current_active_user,
+    get_or_create_user,
     AuthenticatedUser
 )
+from core.audit_queue import client_metadata, enqueue_audit_log, insert_audit_log_async
 from core.config import settings
 from core.exceptions import AuthenticationError, ValidationError
-from database.base import get_db
+from database.base import get_db_async
 from database.models.user import User
-from database.models.audit_log import AuditLog
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 security = HTTPBearer()
 
+ACCESS_TOKEN_TTL_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# Token fields are validated by pydantic-core constraints rather than Python validators
+TokenStr = Annotated[str, StringConstraints(min_length=10)]
+
 
 class FirebaseLoginRequest(BaseModel):
     """Request model for Firebase authentication."""
-    firebase_token: str
+    firebase_token: TokenStr
     device_info: Optional[dict] = None
-    
-    @validator('firebase_token')
-    def validate_firebase_token(cls, v):
-        if not v or len(v) < 10:
-            raise ValueError('Invalid Firebase token format')
-        return v
 
 
 class JWTLoginRequest(BaseModel):
     """Request model for JWT authentication."""
     email: EmailStr
-    password: str  # This would be hashed
+    password: Annotated[str, StringConstraints(min_length=1)]  # This would be hashed
     remember_me: bool = False
     device_info: Optional[dict] = None
 
@@ -63,7 +63,7 @@ class TokenResponse(BaseModel):
 
 class RefreshTokenRequest(BaseModel):
     """Request model for token refresh."""
-    refresh_token: str
+    refresh_token: TokenStr
 
 
 class LogoutRequest(BaseModel):
@@ -71,11 +71,18 @@ class LogoutRequest(BaseModel):
     all_devices: bool = False
 
 
+class ConsentUpdate(BaseModel):
+    """Request model for consent preference updates."""
+    research_participation_consent: Optional[bool] = None
+    data_sharing_consent: Optional[bool] = None
+    consent_version_id: Optional[str] = None
+
+
 @router.post("/firebase-login", response_model=TokenResponse)
 async def firebase_login(
     request: Request,
     login_data: FirebaseLoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Authenticate user with Firebase ID token.
@@ -83,12 +90,13 @@ async def firebase_login(
     This endpoint accepts a Firebase ID token, verifies it, and returns
     JWT tokens for API access along with user information.
     """
+    ip_address, user_agent = client_metadata(request)
+    
     try:
         # Verify Firebase token
         firebase_user_info = await verify_firebase_token(login_data.firebase_token)
         
         # Get or create user in database
-        from core.auth import get_or_create_user
         user = await get_or_create_user(firebase_user_info, db)
         
         # Create JWT tokens
@@ -104,25 +112,23 @@ async def firebase_login(
         refresh_token = create_refresh_token(user.pseudonym_id)
         
         # Log successful authentication
-        audit_log = AuditLog(
+        enqueue_audit_log(
             user_pseudonym_id=user.pseudonym_id,
             event_type="login_success",
             event_category="authentication",
             event_description="Successful Firebase authentication",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "auth_method": "firebase",
                 "device_info": login_data.device_info
             }
         )
-        db.add(audit_log)
-        db.commit()
         
         return TokenResponse(
             access_token=access_token,
             refresh_token=refresh_token,
-            expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            expires_in=ACCESS_TOKEN_TTL_SECONDS,
             user_info={
                 "pseudonym_id": user.pseudonym_id,
                 "email": firebase_user_info.get("email"),
@@ -140,19 +146,17 @@ async def firebase_login(
         logger.error(f"Firebase login failed: {e}")
         
         # Log failed authentication attempt
-        audit_log = AuditLog(
+        enqueue_audit_log(
             event_type="login_failed",
             event_category="security",
             event_description="Failed Firebase authentication attempt",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "auth_method": "firebase",
                 "error": str(e)
             }
         )
-        db.add(audit_log)
-        db.commit()
         
         raise AuthenticationError("Firebase authentication failed")
 
@@ -161,7 +165,7 @@ async def firebase_login(
 async def refresh_token(
     request: Request,
     refresh_data: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Refresh access token using refresh token.
@@ -169,12 +173,18 @@ async def refresh_token(
     Validates the refresh token and issues a new access token
     if the refresh token is valid and not expired.
     """
+    ip_address, user_agent = client_metadata(request)
+    
     try:
         # Verify refresh token
         token_data = await verify_jwt_token(refresh_data.refresh_token)
         
-        # Get user from database
-        user = db.query(User).filter(User.pseudonym_id == token_data.user_id).first()
+        # Read the account flags fresh by primary key so a deactivated
+        # account can't keep refreshing from a stale copy
+        user = (await db.execute(
+            select(User.pseudonym_id, User.is_active, User.is_consented)
+            .where(User.pseudonym_id == token_data.user_id)
+        )).first()
         if not user or not user.is_active:
             raise AuthenticationError("User not found or inactive")
         
@@ -189,21 +199,19 @@ async def refresh_token(
         new_refresh_token = create_refresh_token(user.pseudonym_id)
         
         # Log token refresh
-        audit_log = AuditLog(
+        enqueue_audit_log(
             user_pseudonym_id=user.pseudonym_id,
             event_type="token_refreshed",
             event_category="authentication",
             event_description="Access token refreshed",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown")
+            ip_address=ip_address,
+            user_agent=user_agent
         )
-        db.add(audit_log)
-        db.commit()
         
         return TokenResponse(
             access_token=new_access_token,
             refresh_token=new_refresh_token,
-            expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            expires_in=ACCESS_TOKEN_TTL_SECONDS,
             user_info={
                 "pseudonym_id": user.pseudonym_id,
                 "is_active": user.is_active,
@@ -222,8 +230,7 @@ async def refresh_token(
 async def logout(
     request: Request,
     logout_data: LogoutRequest,
-    current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user)
 ):
     """
     Logout user and invalidate tokens.
@@ -231,21 +238,21 @@ async def logout(
     In a production system, this would invalidate the refresh token
     and optionally all user sessions if requested.
     """
+    ip_address, user_agent = client_metadata(request)
+    
     try:
         # Log logout event
-        audit_log = AuditLog(
+        enqueue_audit_log(
             user_pseudonym_id=current_user.pseudonym_id,
             event_type="logout",
             event_category="authentication",
             event_description="User logout",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "all_devices": logout_data.all_devices
             }
         )
-        db.add(audit_log)
-        db.commit()
         
         # In a full implementation, you would:
         # 1. Add the tokens to a blacklist/revocation list
@@ -264,8 +271,8 @@ async def logout(
 
 @router.get("/me")
 async def get_current_user_info(
-    current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: AuthenticatedUser = Depends(get_current_active_user)
 ):
     """
     Get current user information.
@@ -274,13 +281,8 @@ async def get_current_user_info(
     including consent status and research participation.
     """
     try:
-        # Get full user data from database
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
+        # get_current_user already loaded the full row
+        user = request.state.user
         
         return {
             "pseudonym_id": user.pseudonym_id,
@@ -329,9 +331,9 @@ async def verify_token(
 @router.post("/consent")
 async def update_consent(
     request: Request,
-    consent_data: dict,  # Would define proper consent model
+    consent_data: ConsentUpdate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Update user consent preferences.
@@ -339,24 +341,16 @@ async def update_consent(
     Handles research participation consent, data sharing consent,
     and other privacy preferences required for research compliance.
     """
+    ip_address, user_agent = client_metadata(request)
+    
     try:
-        # Get user from database
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        # Update consent fields
-        if "research_participation_consent" in consent_data:
-            user.research_participation_consent = consent_data["research_participation_consent"]
+        # get_current_user already loaded the row in this request's session
+        user = request.state.user
         
-        if "data_sharing_consent" in consent_data:
-            user.data_sharing_consent = consent_data["data_sharing_consent"]
-        
-        if "consent_version_id" in consent_data:
-            user.consent_version_id = consent_data["consent_version_id"]
+        # Update consent fields that were provided
+        consent_changes = consent_data.model_dump(exclude_unset=True)
+        for field, value in consent_changes.items():
+            setattr(user, field, value)
         
         # Mark as consented if all required consents are given
         user.is_consented = (
@@ -364,20 +358,18 @@ async def update_consent(
             user.consent_version_id is not None
         )
         
-        db.commit()
-        
-        # Log consent update
-        audit_log = AuditLog(
+        # Log consent update in the same transaction as the change itself
+        await insert_audit_log_async(
+            db,
             user_pseudonym_id=user.pseudonym_id,
             event_type="consent_updated",
             event_category="compliance",
             event_description="User consent preferences updated",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            additional_data=consent_data
+            ip_address=ip_address,
+            user_agent=user_agent,
+            additional_data=consent_changes
         )
-        db.add(audit_log)
-        db.commit()
+        await db.commit()
         
         return {
             "message": "Consent updated successfully",
@@ -390,7 +382,7 @@ async def update_consent(
         raise
     except Exception as e:
         logger.error(f"Failed to update consent: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update consent preferences"
@@ -3,19 +3,144 @@ Data import router for CSV dataset uploads and processing.
 Handles the N-SUMHSS mental health services survey data import.
 """
 
-from fastapi import APIRouter, HTTPException, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi.responses import ORJSONResponse
+import numpy as np
 import pandas as pd
-import io
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, Any
-from ...core.auth import get_current_admin_user
+import os
+from functools import lru_cache
+from typing import Dict, Any, BinaryIO
+from cachetools import LRUCache
+from ...core.auth import require_admin_role, AuthenticatedUser
 from ...database.base import SessionLocal
 from ...database.seeds.generate_seed_data import SeedDataGenerator
 
-router = APIRouter(prefix="/api/data-import", tags=["data-import"])
+router = APIRouter(prefix="/api/data-import", tags=["data-import"], default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
+# Shared generator instance for dataset extraction and import
+seed_generator = SeedDataGenerator()
+
+CSV_CHUNK_ROWS = 100_000
+UPLOAD_READ_CHUNK_BYTES = 1 << 20
+
+# Profiles of recently uploaded files keyed by SHA-256 of their contents
+_upload_profile_cache = LRUCache(maxsize=32)
+
+NSUMHSS_CSV_PATH = "data-science/data/extracted/NSUMHSS_2023_PUF_CSV.csv"
+NSUMHSS_PARQUET_PATH = "data-science/data/extracted/NSUMHSS_2023_PUF.parquet"
+NSUMHSS_STATS_PATH = "data-science/data/extracted/nsumhss_stats.parquet"
+
+
+def _is_fresh(derived_path: str, source_path: str = NSUMHSS_CSV_PATH) -> bool:
+    """Check whether a derived file exists and is at least as new as its source."""
+    return (
+        os.path.exists(derived_path)
+        and os.path.getmtime(derived_path) >= os.path.getmtime(source_path)
+    )
+
+
+@lru_cache(maxsize=1)
+def _read_nsumhss_dataset() -> pd.DataFrame:
+    """Load the N-SUMHSS dataset once per process, building a parquet sidecar when stale."""
+    if _is_fresh(NSUMHSS_PARQUET_PATH):
+        return pd.read_parquet(NSUMHSS_PARQUET_PATH, dtype_backend="pyarrow")
+    
+    df = pd.read_csv(NSUMHSS_CSV_PATH, engine="pyarrow", dtype_backend="pyarrow")
+    df.to_parquet(NSUMHSS_PARQUET_PATH, index=False)
+    logger.info(f"Wrote N-SUMHSS parquet sidecar: {NSUMHSS_PARQUET_PATH}")
+    return df
+
+
+def _summarize_column(column_name: str, column_data: pd.Series) -> Dict[str, Any]:
+    """Compute the summary statistics served by the column analysis endpoint."""
+    is_numeric = pd.api.types.is_numeric_dtype(column_data)
+    non_null_count = column_data.count()
+    stats = {
+        "column_name": column_name,
+        "data_type": str(column_data.dtype),
+        "non_null_count": non_null_count,
+        "null_count": len(column_data) - non_null_count,
+        "unique_values": column_data.nunique(),
+        "is_numeric": is_numeric,
+        "mean": None,
+        "median": None,
+        "std": None,
+        "min": None,
+        "max": None,
+        "top_values": None
+    }
+    
+    if is_numeric:
+        # One describe() pass yields every moment; casting first keeps bool
+        # columns on the numeric describe() path and turns missing values into NaN
+        description = column_data.astype("float64").describe()
+        stats.update({
+            "mean": description["mean"],
+            "median": description["50%"],
+            "std": description["std"],
+            "min": description["min"],
+            "max": description["max"]
+        })
+    else:
+        # Stored as JSON so mixed value types fit a single parquet column
+        value_counts = column_data.value_counts().head(10)
+        stats["top_values"] = json.dumps({str(value): int(count) for value, count in value_counts.items()})
+    
+    return stats
+
+
+@lru_cache(maxsize=1)
+def _load_column_stats() -> pd.DataFrame:
+    """Load precomputed per-column statistics, rebuilding the parquet sidecar when stale."""
+    if _is_fresh(NSUMHSS_STATS_PATH):
+        return pd.read_parquet(NSUMHSS_STATS_PATH).set_index("column_name")
+    
+    df = _read_nsumhss_dataset()
+    stats = pd.DataFrame([_summarize_column(name, df[name]) for name in df.columns])
+    stats.to_parquet(NSUMHSS_STATS_PATH, index=False)
+    logger.info(f"Wrote N-SUMHSS column statistics: {NSUMHSS_STATS_PATH}")
+    return stats.set_index("column_name")
+
+
+def _merge_dtypes(current: np.dtype, new: np.dtype) -> np.dtype:
+    """Widen a column dtype so it can hold values seen in a later chunk."""
+    if current == new:
+        return current
+    try:
+        return np.result_type(current, new)
+    except TypeError:
+        return np.dtype(object)
+
+
+def _profile_csv(stream: BinaryIO) -> Dict[str, Any]:
+    """Profile a CSV stream chunk by chunk so the full file is never held in memory."""
+    total_rows = 0
+    columns = []
+    sample_data = []
+    data_types = {}
+    
+    for chunk in pd.read_csv(stream, encoding="utf-8", chunksize=CSV_CHUNK_ROWS):
+        if total_rows == 0:
+            columns = chunk.columns.tolist()
+            sample_data = chunk.head(5).to_dict('records')
+            data_types = chunk.dtypes.to_dict()
+        else:
+            for column, dtype in chunk.dtypes.items():
+                data_types[column] = _merge_dtypes(data_types[column], dtype)
+        total_rows += len(chunk)
+    
+    return {
+        "shape": (total_rows, len(columns)),
+        "columns": columns,
+        "sample_data": sample_data,
+        "data_types": {column: str(dtype) for column, dtype in data_types.items()}
+    }
+
 
 @router.post("/csv-upload")
 async def upload_csv_dataset(file: UploadFile = File(...)):
@@ -25,22 +150,27 @@ async def upload_csv_dataset(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
     try:
-        # Read the uploaded file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        # Hash the spooled upload in fixed-size chunks, then rewind for parsing
+        sha256 = hashlib.sha256()
+        while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+        await file.seek(0)
+        
+        # Re-uploads of identical content reuse the earlier profile
+        profile = _upload_profile_cache.get(digest)
+        if profile is None:
+            # Parse the upload in chunks, off the event loop
+            loop = asyncio.get_running_loop()
+            profile = await loop.run_in_executor(None, _profile_csv, file.file)
+            _upload_profile_cache[digest] = profile
         
         # Basic dataset info
-        dataset_info = {
-            "filename": file.filename,
-            "shape": df.shape,
-            "columns": df.columns.tolist(),
-            "sample_data": df.head(5).to_dict('records'),
-            "data_types": df.dtypes.astype(str).to_dict()
-        }
+        dataset_info = {"filename": file.filename, "sha256": digest, **profile}
         
-        logger.info(f"Uploaded CSV dataset: {file.filename} with shape {df.shape}")
+        logger.info(f"Uploaded CSV dataset: {file.filename} with shape {profile['shape']}")
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "message": "CSV dataset uploaded successfully",
             "dataset_info": dataset_info
         })
@@ -55,18 +185,16 @@ async def load_nsumhss_dataset():
     """Load the N-SUMHSS dataset from local files."""
     
     try:
-        generator = SeedDataGenerator()
-        
         # Path to the dataset
         zip_path = "data-science/data/N-SUMHSS-2023-DS0001-bndl-data-csv_v1.zip"
         extract_to = "data-science/data/extracted"
         
         # Extract and load dataset
-        csv_path = generator.extract_zip_dataset(zip_path, extract_to)
-        df = generator.import_csv_dataset(csv_path)
+        csv_path = seed_generator.extract_zip_dataset(zip_path, extract_to)
+        df = seed_generator.import_csv_dataset(csv_path)
         
         # Return dataset summary
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "message": "N-SUMHSS dataset loaded successfully",
             "dataset_info": {
                 "name": "National Survey on Mental Health Service Systems 2023",
@@ -87,40 +215,30 @@ async def analyze_dataset_column(column_name: str):
     """Analyze a specific column from the loaded dataset."""
     
     try:
-        # Load dataset
-        csv_path = "data-science/data/extracted/NSUMHSS_2023_PUF_CSV.csv"
-        df = pd.read_csv(csv_path)
+        stats = _load_column_stats()
         
-        if column_name not in df.columns:
+        if column_name not in stats.index:
             raise HTTPException(status_code=404, detail=f"Column '{column_name}' not found")
         
-        column_data = df[column_name]
+        column_stats = stats.loc[column_name]
         
-        # Basic statistics
+        # Basic statistics (orjson handles the NumPy scalars and NaN directly)
         analysis = {
             "column_name": column_name,
-            "data_type": str(column_data.dtype),
-            "non_null_count": int(column_data.count()),
-            "null_count": int(column_data.isnull().sum()),
-            "unique_values": int(column_data.nunique())
+            **column_stats[["data_type", "non_null_count", "null_count", "unique_values"]].to_dict()
         }
         
         # Add specific statistics based on data type
-        if pd.api.types.is_numeric_dtype(column_data):
-            analysis.update({
-                "mean": float(column_data.mean()) if not column_data.empty else None,
-                "median": float(column_data.median()) if not column_data.empty else None,
-                "std": float(column_data.std()) if not column_data.empty else None,
-                "min": float(column_data.min()) if not column_data.empty else None,
-                "max": float(column_data.max()) if not column_data.empty else None
-            })
+        if column_stats["is_numeric"]:
+            analysis.update(column_stats[["mean", "median", "std", "min", "max"]].to_dict())
         else:
             # For categorical data
-            value_counts = column_data.value_counts().head(10)
-            analysis["top_values"] = value_counts.to_dict()
+            analysis["top_values"] = json.loads(column_stats["top_values"])
         
-        return JSONResponse(content=analysis)
+        return ORJSONResponse(content=analysis)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Column analysis failed: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
@@ -131,8 +249,11 @@ async def get_dataset_summary():
     """Get a comprehensive summary of the N-SUMHSS dataset."""
     
     try:
-        csv_path = "data-science/data/extracted/NSUMHSS_2023_PUF_CSV.csv"
-        df = pd.read_csv(csv_path)
+        df = _read_nsumhss_dataset()
+        
+        # Build the null mask once and derive every data-quality count from it
+        null_mask = df.isnull().to_numpy()
+        records_with_missing = int(null_mask.any(axis=1).sum())
         
         # Generate comprehensive summary
         summary = {
@@ -141,9 +262,9 @@ async def get_dataset_summary():
             "total_records": len(df),
             "total_variables": len(df.columns),
             "data_quality": {
-                "complete_records": int((~df.isnull().any(axis=1)).sum()),
-                "records_with_missing": int(df.isnull().any(axis=1).sum()),
-                "total_missing_values": int(df.isnull().sum().sum())
+                "complete_records": len(df) - records_with_missing,
+                "records_with_missing": records_with_missing,
+                "total_missing_values": int(null_mask.sum())
             },
             "key_variables": {
                 "facility_id": "MPRID" if "MPRID" in df.columns else None,
@@ -154,8 +275,19 @@ async def get_dataset_summary():
             "sample_columns": df.columns.tolist()[:30]
         }
         
-        return JSONResponse(content=summary)
+        return ORJSONResponse(content=summary)
         
     except Exception as e:
         logger.error(f"Dataset summary failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Summary failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Summary failed: {str(e)}")
+
+
+@router.post("/dataset-cache/clear")
+async def clear_dataset_cache(current_user: AuthenticatedUser = Depends(require_admin_role)):
+    """Drop the in-process N-SUMHSS dataset so the next request reloads it from disk."""
+    
+    _read_nsumhss_dataset.cache_clear()
+    _load_column_stats.cache_clear()
+    logger.info(f"N-SUMHSS dataset cache cleared by {current_user.pseudonym_id}")
+    
+    return ORJSONResponse(content={"message": "Dataset cache cleared"})
@@ -3,27 +3,34 @@ Mental Health Facilities API endpoints.
 Provides facility search, nearby lookup, and SAMHSA data integration.
 """
 
+import hashlib
 import logging
+import threading
 from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from urllib.parse import urlencode
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+import orjson
+from cachetools import TTLCache
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...core.auth import get_current_active_user, AuthenticatedUser
 from ...core.config import settings
-from ...core.exceptions import ResourceNotFoundError, ValidationError
-from ...database.base import get_db
+from ...core.exceptions import ResourceNotFoundError
+from ...core.middleware import create_route_limiter
+from ...database.base import AsyncSessionLocal, get_db_async
 from ...database.queries.mental_health_facilities import (
     insert_facility,
     update_facility,
     get_nearby_facilities,
     search_facilities,
     get_facility_by_id,
-    get_facilities_by_state,
+    stream_facilities_by_state,
     get_facility_statistics
 )
 from ...schemas.mental_health_facility import (
@@ -33,12 +40,107 @@ from ...schemas.mental_health_facility import (
     NearbyFacilitiesRequest,
     FacilitySearchRequest,
     FacilitiesResponse,
-    MentalHealthFacility
+    MentalHealthFacility,
+    CsvList,
+    StateAbbrev,
+    facility_list_adapter
 )
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/api/facilities", tags=["facilities"])
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(prefix="/api/facilities", tags=["facilities"], default_response_class=ORJSONResponse)
+limiter = create_route_limiter()
+
+# Short-lived cache of serialized read responses, keyed on path + canonical query string
+FACILITY_CACHE_TTL_SECONDS = 60
+FACILITY_STATS_CACHE_TTL_SECONDS = 300
+# Responses sit behind authentication, so only the client (not shared proxies) may store them
+FACILITY_CACHE_CONTROL = "private, max-age=60, stale-while-revalidate=300"
+
+_facility_cache: TTLCache = TTLCache(maxsize=2048, ttl=FACILITY_CACHE_TTL_SECONDS)
+_facility_stats_cache: TTLCache = TTLCache(maxsize=1, ttl=FACILITY_STATS_CACHE_TTL_SECONDS)
+_facility_cache_lock = threading.Lock()
+
+
+def _facility_cache_key(request: Request) -> str:
+    """Build a cache key that ignores query parameter order."""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def _render_cached(request: Request, body: bytes, etag: str) -> Response:
+    """Return the cached body, or 304 when the client already holds this ETag."""
+    headers = {"ETag": etag, "Cache-Control": FACILITY_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _get_cached_facility_response(request: Request, cache: TTLCache, key: str) -> Optional[Response]:
+    """Serve a cached response without touching the database."""
+    with _facility_cache_lock:
+        entry: Optional[Tuple[bytes, str]] = cache.get(key)
+    if entry is None:
+        return None
+    return _render_cached(request, *entry)
+
+
+def _store_facility_response(cache: TTLCache, key: str, body: bytes) -> str:
+    """Store a serialized response under its weak ETag and return the ETag."""
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+    with _facility_cache_lock:
+        cache[key] = (body, etag)
+    return etag
+
+
+def _cache_facility_response(request: Request, cache: TTLCache, key: str, body: bytes) -> Response:
+    """Store a serialized response with its weak ETag and render it."""
+    return _render_cached(request, body, _store_facility_response(cache, key, body))
+
+
+async def _stream_state_facilities(state: str, limit: int, cache_key: str) -> AsyncIterator[bytes]:
+    """
+    Stream a FacilitiesResponse JSON body row by row, then cache the full body.
+    
+    Opens its own session: yield-dependencies are closed before a streaming
+    response body is sent.
+    """
+    chunks = [b'{"facilities":[']
+    yield chunks[0]
+    
+    count = 0
+    try:
+        async with AsyncSessionLocal() as db:
+            async for facility in stream_facilities_by_state(db, state, limit):
+                chunk = FacilityResponse.model_validate(facility).model_dump_json().encode()
+                if count:
+                    chunk = b"," + chunk
+                count += 1
+                chunks.append(chunk)
+                yield chunk
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body
+        logger.error(f"Failed to stream facilities for state {state}: {e}")
+        raise
+    
+    tail = (
+        b'],"total_count":' + str(count).encode()
+        + b',"search_center":null,"search_radius_miles":null'
+        + b',"filters_applied":' + orjson.dumps({"state": state, "active_only": True})
+        + b'}'
+    )
+    chunks.append(tail)
+    yield tail
+    
+    _store_facility_response(_facility_cache, cache_key, b"".join(chunks))
+    logger.info(f"State query: {count} facilities streamed for {state}")
+
+
+def invalidate_facility_cache():
+    """Drop cached facility responses after a write."""
+    with _facility_cache_lock:
+        _facility_cache.clear()
+        _facility_stats_cache.clear()
 
 
 @router.get("/nearby", response_model=FacilitiesResponse)
@@ -49,28 +151,29 @@ async def get_nearby_mental_health_facilities(
     longitude: float = Query(..., ge=-180, le=180, description="Search center longitude"),
     radius: float = Query(10.0, ge=0.1, le=100.0, description="Search radius in miles"),
     facility_type: Optional[str] = Query(None, description="Filter by facility type"),
-    services: Optional[str] = Query(None, description="Comma-separated list of services"),
-    payment_types: Optional[str] = Query(None, description="Comma-separated payment types"),
-    languages: Optional[str] = Query(None, description="Comma-separated languages"),
+    services: CsvList = Query(None, description="Comma-separated services; each must exactly match (case-sensitive) a listed service"),
+    payment_types: CsvList = Query(None, description="Comma-separated payment types; each must exactly match (case-sensitive) an accepted payment type"),
+    languages: CsvList = Query(None, description="Comma-separated languages; each must exactly match (case-sensitive) a spoken language"),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of results"),
     verified_only: bool = Query(False, description="Only verified facilities"),
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Find mental health facilities near a specific location.
     
     Uses PostGIS spatial queries to find facilities within the specified radius.
     Supports filtering by facility type, services, payment methods, and languages.
+    List filters are exact, case-sensitive matches, and a facility must offer every value given.
     
     Returns facilities ordered by distance from the search center.
     """
+    cache_key = _facility_cache_key(request)
+    cached = _get_cached_facility_response(request, _facility_cache, cache_key)
+    if cached:
+        return cached
+    
     try:
-        # Parse filter parameters
-        services_list = [s.strip() for s in services.split(',')] if services else None
-        payment_types_list = [p.strip() for p in payment_types.split(',')] if payment_types else None
-        languages_list = [l.strip() for l in languages.split(',')] if languages else None
-        
         # Get nearby facilities
         facilities = await get_nearby_facilities(
             db=db,
@@ -78,18 +181,15 @@ async def get_nearby_mental_health_facilities(
             longitude=longitude,
             radius_miles=radius,
             facility_type=facility_type,
-            services=services_list,
-            payment_types=payment_types_list,
-            languages=languages_list,
+            services=services,
+            payment_types=payment_types,
+            languages=languages,
             limit=limit,
             only_verified=verified_only
         )
         
-        # Convert to response format
-        facility_responses = []
-        for facility in facilities:
-            facility_dict = facility.to_dict(include_distance=True)
-            facility_responses.append(FacilityResponse(**facility_dict))
+        # Convert to response format straight from the ORM rows
+        facility_responses = facility_list_adapter.validate_python(facilities, from_attributes=True)
         
         response = FacilitiesResponse(
             facilities=facility_responses,
@@ -98,15 +198,17 @@ async def get_nearby_mental_health_facilities(
             search_radius_miles=radius,
             filters_applied={
                 "facility_type": facility_type,
-                "services": services_list,
-                "payment_types": payment_types_list,
-                "languages": languages_list,
+                "services": services,
+                "payment_types": payment_types,
+                "languages": languages,
                 "verified_only": verified_only
             }
         )
         
         logger.info(f"Nearby search: {len(facilities)} facilities found within {radius} miles of ({latitude}, {longitude})")
-        return response
+        return _cache_facility_response(
+            request, _facility_cache, cache_key, response.model_dump_json().encode()
+        )
         
     except HTTPException:
         raise
@@ -123,44 +225,44 @@ async def get_nearby_mental_health_facilities(
 async def search_mental_health_facilities(
     request: Request,
     q: str = Query(..., min_length=2, max_length=200, description="Search query"),
-    state: Optional[str] = Query(None, min_length=2, max_length=2, description="Filter by state"),
+    state: Optional[StateAbbrev] = Query(None, description="Filter by state"),
     city: Optional[str] = Query(None, max_length=100, description="Filter by city"),
     facility_type: Optional[str] = Query(None, description="Filter by facility type"),
-    services: Optional[str] = Query(None, description="Comma-separated services"),
+    services: CsvList = Query(None, description="Comma-separated services; each must exactly match (case-sensitive) a listed service"),
     limit: int = Query(50, ge=1, le=100, description="Maximum results"),
     active_only: bool = Query(True, description="Only active facilities"),
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Search mental health facilities by name, description, or services.
     
     Uses PostgreSQL full-text search with ranking for relevance.
     Supports filtering by location, facility type, and services.
+    The services filter is an exact, case-sensitive match on every value given.
     
     Returns facilities ordered by search relevance.
     """
+    cache_key = _facility_cache_key(request)
+    cached = _get_cached_facility_response(request, _facility_cache, cache_key)
+    if cached:
+        return cached
+    
     try:
-        # Parse services filter
-        services_list = [s.strip() for s in services.split(',')] if services else None
-        
         # Perform text search
         facilities = await search_facilities(
             db=db,
             query_text=q,
-            state=state.upper() if state else None,
+            state=state,
             city=city,
             facility_type=facility_type,
-            services=services_list,
+            services=services,
             limit=limit,
             only_active=active_only
         )
         
-        # Convert to response format
-        facility_responses = []
-        for facility in facilities:
-            facility_dict = facility.to_dict()
-            facility_responses.append(FacilityResponse(**facility_dict))
+        # Convert to response format straight from the ORM rows
+        facility_responses = facility_list_adapter.validate_python(facilities, from_attributes=True)
         
         response = FacilitiesResponse(
             facilities=facility_responses,
@@ -170,13 +272,15 @@ async def search_mental_health_facilities(
                 "state": state,
                 "city": city,
                 "facility_type": facility_type,
-                "services": services_list,
+                "services": services,
                 "active_only": active_only
             }
         )
         
         logger.info(f"Text search: {len(facilities)} facilities found for query '{q}'")
-        return response
+        return _cache_facility_response(
+            request, _facility_cache, cache_key, response.model_dump_json().encode()
+        )
         
     except HTTPException:
         raise
@@ -194,7 +298,7 @@ async def get_facility_details(
     request: Request,
     facility_id: str,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Get detailed information about a specific facility.
@@ -202,17 +306,23 @@ async def get_facility_details(
     Returns complete facility information including contact details,
     services, payment options, and location data.
     """
+    cache_key = _facility_cache_key(request)
+    cached = _get_cached_facility_response(request, _facility_cache, cache_key)
+    if cached:
+        return cached
+    
     try:
         facility = await get_facility_by_id(db, facility_id)
         
         if not facility:
             raise ResourceNotFoundError("Facility", facility_id)
         
-        facility_dict = facility.to_dict()
-        response = FacilityResponse(**facility_dict)
+        response = FacilityResponse.model_validate(facility)
         
         logger.info(f"Retrieved facility details for ID: {facility_id}")
-        return response
+        return _cache_facility_response(
+            request, _facility_cache, cache_key, response.model_dump_json().encode()
+        )
         
     except HTTPException:
         raise
@@ -228,49 +338,29 @@ async def get_facility_details(
 @limiter.limit("60/minute")
 async def get_facilities_by_state_endpoint(
     request: Request,
-    state: str,
+    state: StateAbbrev,
     limit: int = Query(100, ge=1, le=500, description="Maximum results"),
-    current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user)
 ):
     """
     Get all active facilities in a specific state.
     
     Returns facilities ordered alphabetically by name.
     Useful for state-specific facility directories.
+    
+    Uncached results are streamed row by row from a server-side cursor,
+    so large pages (up to 500 facilities) are never held as one object graph.
     """
-    try:
-        if len(state) != 2:
-            raise ValidationError("State must be a 2-character abbreviation")
-        
-        facilities = await get_facilities_by_state(db, state, limit)
-        
-        # Convert to response format
-        facility_responses = []
-        for facility in facilities:
-            facility_dict = facility.to_dict()
-            facility_responses.append(FacilityResponse(**facility_dict))
-        
-        response = FacilitiesResponse(
-            facilities=facility_responses,
-            total_count=len(facility_responses),
-            filters_applied={
-                "state": state.upper(),
-                "active_only": True
-            }
-        )
-        
-        logger.info(f"State query: {len(facilities)} facilities found in {state.upper()}")
-        return response
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Failed to get facilities by state: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve facilities by state"
-        )
+    cache_key = _facility_cache_key(request)
+    cached = _get_cached_facility_response(request, _facility_cache, cache_key)
+    if cached:
+        return cached
+    
+    return StreamingResponse(
+        _stream_state_facilities(state, limit, cache_key),
+        media_type="application/json",
+        headers={"Cache-Control": FACILITY_CACHE_CONTROL}
+    )
 
 
 @router.get("/statistics/overview")
@@ -278,7 +368,7 @@ async def get_facilities_by_state_endpoint(
 async def get_facility_statistics_endpoint(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Get comprehensive statistics about facilities in the database.
@@ -286,11 +376,16 @@ async def get_facility_statistics_endpoint(
     Returns counts by state, facility type, verification status,
     and other aggregate data for analytics and reporting.
     """
+    cache_key = _facility_cache_key(request)
+    cached = _get_cached_facility_response(request, _facility_stats_cache, cache_key)
+    if cached:
+        return cached
+    
     try:
         stats = await get_facility_statistics(db)
         
         logger.info("Retrieved facility statistics")
-        return stats
+        return _cache_facility_response(request, _facility_stats_cache, cache_key, orjson.dumps(stats))
         
     except HTTPException:
         raise
@@ -308,7 +403,7 @@ async def create_facility(
     request: Request,
     facility_data: FacilityCreate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Create a new mental health facility record.
@@ -317,21 +412,18 @@ async def create_facility(
     with spatial location data and service information.
     """
     try:
-        # Check if facility with this ID already exists
-        existing = await get_facility_by_id(db, facility_data.facility_id)
-        if existing:
+        # Insert atomically; None means the facility ID is already taken
+        facility = await insert_facility(db, facility_data)
+        if facility is None:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Facility with ID {facility_data.facility_id} already exists"
             )
         
-        # Create the facility
-        facility = await insert_facility(db, facility_data)
-        
-        facility_dict = facility.to_dict()
-        response = FacilityResponse(**facility_dict)
+        response = FacilityResponse.model_validate(facility)
         
         logger.info(f"Created new facility: {facility.name} (ID: {facility.facility_id})")
+        invalidate_facility_cache()
         return response
         
     except HTTPException:
@@ -351,7 +443,7 @@ async def update_facility_endpoint(
     facility_id: str,
     update_data: FacilityUpdate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Update an existing mental health facility.
@@ -365,10 +457,10 @@ async def update_facility_endpoint(
         if not facility:
             raise ResourceNotFoundError("Facility", facility_id)
         
-        facility_dict = facility.to_dict()
-        response = FacilityResponse(**facility_dict)
+        response = FacilityResponse.model_validate(facility)
         
         logger.info(f"Updated facility: {facility.name} (ID: {facility_id})")
+        invalidate_facility_cache()
         return response
         
     except HTTPException:
@@ -383,18 +475,19 @@ async def update_facility_endpoint(
 
 # Health check endpoint
 @router.get("/health/status")
-@limiter.limit("100/minute")
-async def facility_service_health(request: Request, db: Session = Depends(get_db)):
+@limiter.limit("200/minute")
+async def facility_service_health(request: Request, db: AsyncSession = Depends(get_db_async)):
     """Health check for facility service."""
     try:
-        # Test database connectivity and PostGIS
-        result = db.execute("SELECT ST_AsText(ST_GeogFromText('POINT(-122.4194 37.7749)'))").scalar()
+        # Connectivity only; PostGIS availability is probed once at startup
+        await db.execute(text("SELECT 1"))
+        postgis_version = getattr(request.app.state, "postgis_version", None)
         
         return {
             "status": "healthy",
             "service": "mental_health_facilities",
             "database": "connected",
-            "postgis": "active",
+            "postgis": postgis_version or "unavailable",
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
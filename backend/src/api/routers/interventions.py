@@ -3,20 +3,62 @@ Research Interventions endpoints for MindMap Research API.
 Handles A/B testing and intervention tracking for research studies.
 """
 
+import base64
+import binascii
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.auth import get_current_consented_user, require_researcher_role, AuthenticatedUser
-from database.base import get_db
+from database.base import get_db_async
 from database.models.intervention_log import InterventionLog
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+CURSOR_SEPARATOR = "|"
+
+# Only the columns the response needs, in InterventionResponse field order
+INTERVENTION_COLUMNS = (
+    InterventionLog.log_id,
+    InterventionLog.intervention_type,
+    InterventionLog.status,
+    InterventionLog.immediate_effectiveness,
+    InterventionLog.short_term_effectiveness,
+    InterventionLog.engagement_score,
+    InterventionLog.delivered_at,
+)
+
+
+def _encode_cursor(delivered_at: datetime, log_id: str) -> str:
+    """
+    Build an opaque pagination cursor for a (delivered_at, log_id) position.
+    
+    URL-safe base64 keeps the "+00:00" offset from being read back as a
+    space when clients pass the cursor unencoded in the query string.
+    """
+    raw = f"{delivered_at.isoformat()}{CURSOR_SEPARATOR}{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Split a pagination cursor into its (delivered_at, log_id) position."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        delivered_at, log_id = raw.split(CURSOR_SEPARATOR, 1)
+        return datetime.fromisoformat(delivered_at), log_id
+    except (ValueError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
 
 
 class InterventionResponse(BaseModel):
@@ -27,36 +69,64 @@ class InterventionResponse(BaseModel):
     immediate_effectiveness: Optional[int]
     short_term_effectiveness: Optional[int]
     engagement_score: float
-    delivered_at: str
+    delivered_at: datetime
+    
+    model_config = ConfigDict(extra='ignore', from_attributes=True, validate_assignment=False)
+
+
+intervention_list_adapter = TypeAdapter(List[InterventionResponse])
 
 
 @router.get("/", response_model=List[InterventionResponse])
 async def get_user_interventions(
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of interventions"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     current_user: AuthenticatedUser = Depends(get_current_consented_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
-    """Get user's intervention history."""
+    """
+    Get user's intervention history, newest first.
+    
+    Uses keyset pagination on (delivered_at, log_id); when more rows exist the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    query = select(*INTERVENTION_COLUMNS).where(
+        InterventionLog.user_pseudonym_id == current_user.pseudonym_id
+    )
+    
+    if cursor:
+        cursor_delivered_at, cursor_log_id = _decode_cursor(cursor)
+        query = query.where(
+            tuple_(InterventionLog.delivered_at, InterventionLog.log_id)
+            < tuple_(cursor_delivered_at, cursor_log_id)
+        )
+    
     try:
-        interventions = db.query(InterventionLog).filter(
-            InterventionLog.user_pseudonym_id == current_user.pseudonym_id
-        ).all()
+        # Fetch one extra row to know whether another page exists
+        rows = (await db.execute(
+            query.order_by(
+                InterventionLog.delivered_at.desc(),
+                InterventionLog.log_id.desc()
+            ).limit(limit + 1)
+        )).all()
+        
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            headers["X-Next-Cursor"] = _encode_cursor(last.delivered_at, last.log_id)
         
-        return [
-            InterventionResponse(
-                log_id=intervention.log_id,
-                intervention_type=intervention.intervention_type,
-                status=intervention.status,
-                immediate_effectiveness=intervention.immediate_effectiveness,
-                short_term_effectiveness=intervention.short_term_effectiveness,
-                engagement_score=intervention.engagement_score,
-                delivered_at=intervention.delivered_at.isoformat()
-            )
-            for intervention in interventions
-        ]
+        # Validate the rows in one adapter call and return directly, skipping
+        # FastAPI's second response_model pass (response_model stays for the schema)
+        interventions = intervention_list_adapter.validate_python(rows, from_attributes=True)
+        return ORJSONResponse(
+            intervention_list_adapter.dump_python(interventions),
+            headers=headers
+        )
         
     except Exception as e:
         logger.error(f"Failed to get interventions: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve interventions"
-        )
\ No newline at end of file
+        )
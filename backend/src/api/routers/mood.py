@@ -4,15 +4,16 @@ Handles mood entries, analysis, and geographic patterns for research.
 """
 
 import logging
-from datetime import datetime, timezone, date, timedelta
-from typing import List, Optional
+from datetime import datetime, timezone, date, time, timedelta
+from typing import List, Literal, Optional
 
+import redis
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
-from pydantic import BaseModel, validator, Field
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
+from sqlalchemy import delete, desc, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from core.auth import (
     get_current_active_user,
@@ -21,14 +22,44 @@ from core.auth import (
 )
 from core.config import settings
 from core.exceptions import ResourceNotFoundError, ValidationError
-from database.base import get_db
+from core.middleware import async_redis_client, create_route_limiter, get_pseudonym_identifier
+from database.base import get_db_async
 from database.models.mood_entry import MoodEntry
 from database.models.user import User
-from database.models.audit_log import AuditLog
+from core.audit_queue import client_metadata, enqueue_audit_log
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(default_response_class=ORJSONResponse)
+limiter = create_route_limiter(key_func=get_pseudonym_identifier)
+
+# Only the columns MoodEntryResponse needs, in field order
+MOOD_ENTRY_COLUMNS = (
+    MoodEntry.entry_id,
+    MoodEntry.mood_score,
+    MoodEntry.anxiety_level,
+    MoodEntry.stress_level,
+    MoodEntry.energy_level,
+    MoodEntry.sleep_quality,
+    MoodEntry.entry_date,
+    MoodEntry.recorded_at,
+    MoodEntry.entry_method,
+    MoodEntry.data_quality,
+    MoodEntry.notes,
+    MoodEntry.location_point.isnot(None).label('has_location'),
+    MoodEntry.is_research_eligible,
+)
+
+# How long after recording an entry can still be modified or deleted
+ENTRY_EDIT_WINDOW = timedelta(hours=24)
+
+# Number of entries at each end of the period compared for the mood trend
+TREND_WINDOW_ENTRIES = 7
+
+# Days covered by each /trends period
+TrendPeriod = Literal["7d", "30d", "90d", "1y"]
+TREND_PERIOD_DAYS = {"7d": 7, "30d": 30, "90d": 90, "1y": 365}
+TRENDS_CACHE_PREFIX = "mood_trends"
+
 
 
 class MoodEntryCreate(BaseModel):
@@ -43,17 +74,18 @@ class MoodEntryCreate(BaseModel):
     latitude: Optional[float] = Field(None, ge=-90, le=90)
     longitude: Optional[float] = Field(None, ge=-180, le=180)
     location_accuracy: Optional[float] = Field(None, gt=0)
-    location_method: Optional[str] = Field(None, regex="^(gps|network|manual)$")
+    location_method: Optional[Literal["gps", "network", "manual"]] = None
     
     # Entry metadata
-    entry_method: Optional[str] = Field("manual", regex="^(manual|prompted|automated)$")
+    entry_method: Optional[Literal["manual", "prompted", "automated"]] = "manual"
     notes: Optional[str] = Field(None, max_length=1000)
     mood_scale: str = Field("1-10", description="Mood scale used")
     
     # Research context
     entry_context: Optional[dict] = None  # Additional context data
     
-    @validator('entry_context')
+    @field_validator('entry_context')
+    @classmethod
     def validate_context(cls, v):
         if v and len(str(v)) > 5000:  # Prevent huge context objects
             raise ValueError('Entry context too large')
@@ -78,13 +110,18 @@ class MoodEntryResponse(BaseModel):
     stress_level: Optional[int]
     energy_level: Optional[int]
     sleep_quality: Optional[int]
-    entry_date: str
-    recorded_at: str
+    entry_date: date
+    recorded_at: datetime
     entry_method: str
     data_quality: str
     notes: Optional[str]
     has_location: bool
     is_research_eligible: bool
+    
+    model_config = ConfigDict(extra='ignore', from_attributes=True, validate_assignment=False)
+
+
+mood_entry_list_adapter = TypeAdapter(List[MoodEntryResponse])
 
 
 class MoodTrendsResponse(BaseModel):
@@ -100,13 +137,74 @@ class MoodTrendsResponse(BaseModel):
     sleep_average: Optional[float]
 
 
+def _trends_cache_key(pseudonym_id: str, period: str) -> str:
+    """Cache key for a user's trends; the date rolls the key over at midnight."""
+    return f"{TRENDS_CACHE_PREFIX}:{pseudonym_id}:{period}:{date.today().isoformat()}"
+
+
+async def _get_cached_trends(pseudonym_id: str, period: str) -> Optional[MoodTrendsResponse]:
+    """Return cached trends from Redis, or None on a miss or when Redis is unavailable."""
+    if not async_redis_client:
+        return None
+    try:
+        cached = await async_redis_client.get(_trends_cache_key(pseudonym_id, period))
+    except redis.RedisError as e:
+        logger.warning(f"Mood trends cache read failed: {e}")
+        return None
+    return MoodTrendsResponse.model_validate_json(cached) if cached else None
+
+
+async def _cache_trends(pseudonym_id: str, trends: MoodTrendsResponse):
+    """Cache trends in Redis until the end of the current day."""
+    if not async_redis_client:
+        return
+    midnight = datetime.combine(date.today() + timedelta(days=1), time.min)
+    ttl = max(1, int((midnight - datetime.now()).total_seconds()))
+    try:
+        await async_redis_client.setex(
+            _trends_cache_key(pseudonym_id, trends.period),
+            ttl,
+            trends.model_dump_json()
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Mood trends cache write failed: {e}")
+
+
+async def invalidate_mood_trends(pseudonym_id: str):
+    """Drop a user's cached trends after their mood entries change."""
+    if not async_redis_client:
+        return
+    try:
+        await async_redis_client.delete(*(
+            _trends_cache_key(pseudonym_id, period) for period in TREND_PERIOD_DAYS
+        ))
+    except redis.RedisError as e:
+        logger.warning(f"Mood trends cache invalidation failed: {e}")
+
+
+async def _raise_entry_not_modifiable(db: AsyncSession, entry_id: str, pseudonym_id: str, action: str):
+    """Explain why a guarded UPDATE/DELETE matched no row: missing entry (404) or too old (403)."""
+    exists = (await db.execute(
+        select(MoodEntry.entry_id).where(
+            MoodEntry.entry_id == entry_id,
+            MoodEntry.user_pseudonym_id == pseudonym_id
+        )
+    )).first()
+    if exists is None:
+        raise ResourceNotFoundError("Mood entry", entry_id)
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Cannot {action} entries older than 24 hours"
+    )
+
+
 @router.post("/entries", response_model=MoodEntryResponse)
 @limiter.limit("60/hour")
 async def create_mood_entry(
     request: Request,
     mood_data: MoodEntryCreate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Create a new mood entry.
@@ -115,18 +213,23 @@ async def create_mood_entry(
     Validates data quality and handles geographic privacy.
     """
     try:
+        now = datetime.now(timezone.utc)
         # Create location point if coordinates provided
         location_point = None
         if mood_data.latitude is not None and mood_data.longitude is not None:
             # In production, add privacy protection by adding noise to coordinates
             privacy_radius = settings.GEOGRAPHIC_PRIVACY_RADIUS_METERS
-            location_point = f'POINT({mood_data.longitude} {mood_data.latitude})'
+            # Bound coordinates; no WKT string for Postgres to parse per insert
+            location_point = func.ST_SetSRID(
+                func.ST_MakePoint(mood_data.longitude, mood_data.latitude),
+                4326
+            )
         
         # Create mood entry
-        mood_entry = MoodEntry(
+        entry_values = dict(
             user_pseudonym_id=current_user.pseudonym_id,
             entry_date=date.today(),
-            recorded_at=datetime.now(timezone.utc),
+            recorded_at=now,
             mood_score=mood_data.mood_score,
             mood_scale=mood_data.mood_scale,
             anxiety_level=mood_data.anxiety_level,
@@ -144,59 +247,64 @@ async def create_mood_entry(
             data_sharing_allowed=True,  # Based on user consent
             demographic_context={
                 "user_pseudonym": current_user.pseudonym_id,
-                "entry_timestamp": datetime.now(timezone.utc).isoformat()
+                "entry_timestamp": now.isoformat()
             },
             entry_context=mood_data.entry_context
         )
         
-        db.add(mood_entry)
-        db.commit()
-        db.refresh(mood_entry)
+        # Core INSERT ... RETURNING: no ORM instance, identity map or refresh
+        entry_id = (await db.execute(
+            insert(MoodEntry).values(**entry_values).returning(MoodEntry.entry_id)
+        )).scalar_one()
+        
+        # Update user engagement score in place, without loading the user row
+        # Simple engagement calculation - would be more sophisticated in production
+        await db.execute(
+            update(User)
+            .where(User.pseudonym_id == current_user.pseudonym_id)
+            .values(engagement_score=func.least(1.0, User.engagement_score + 0.01))
+        )
+        
+        response = MoodEntryResponse(
+            entry_id=entry_id,
+            mood_score=entry_values["mood_score"],
+            anxiety_level=entry_values["anxiety_level"],
+            stress_level=entry_values["stress_level"],
+            energy_level=entry_values["energy_level"],
+            sleep_quality=entry_values["sleep_quality"],
+            entry_date=entry_values["entry_date"],
+            recorded_at=entry_values["recorded_at"],
+            entry_method=entry_values["entry_method"],
+            data_quality=entry_values["data_quality"],
+            notes=entry_values["notes"],
+            has_location=location_point is not None,
+            is_research_eligible=entry_values["is_research_eligible"]
+        )
         
-        # Update user engagement score
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if user:
-            # Simple engagement calculation - would be more sophisticated in production
-            user.engagement_score = min(1.0, user.engagement_score + 0.01)
-            db.commit()
+        await db.commit()
         
-        # Log mood entry creation
-        audit_log = AuditLog(
+        # Log mood entry creation; queued so the write happens off the request path
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
             user_pseudonym_id=current_user.pseudonym_id,
             event_type="mood_entry_created",
             event_category="user_data",
             event_description="New mood entry recorded",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
-                "entry_id": mood_entry.entry_id,
+                "entry_id": entry_id,
                 "mood_score": mood_data.mood_score,
                 "has_location": location_point is not None,
                 "entry_method": mood_data.entry_method
             }
         )
-        db.add(audit_log)
-        db.commit()
-        
-        return MoodEntryResponse(
-            entry_id=mood_entry.entry_id,
-            mood_score=mood_entry.mood_score,
-            anxiety_level=mood_entry.anxiety_level,
-            stress_level=mood_entry.stress_level,
-            energy_level=mood_entry.energy_level,
-            sleep_quality=mood_entry.sleep_quality,
-            entry_date=mood_entry.entry_date.isoformat(),
-            recorded_at=mood_entry.recorded_at.isoformat(),
-            entry_method=mood_entry.entry_method,
-            data_quality=mood_entry.data_quality,
-            notes=mood_entry.notes,
-            has_location=mood_entry.location_point is not None,
-            is_research_eligible=mood_entry.is_research_eligible
-        )
+        await invalidate_mood_trends(current_user.pseudonym_id)
+        return response
         
     except Exception as e:
         logger.error(f"Failed to create mood entry: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create mood entry"
@@ -208,7 +316,7 @@ async def create_mood_entry(
 async def get_mood_entries(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db_async),
     limit: int = Query(30, le=100, description="Maximum number of entries to return"),
     offset: int = Query(0, ge=0, description="Number of entries to skip"),
     start_date: Optional[date] = Query(None, description="Filter entries from this date"),
@@ -222,40 +330,25 @@ async def get_mood_entries(
     """
     try:
         # Build query
-        query = db.query(MoodEntry).filter(
+        query = select(*MOOD_ENTRY_COLUMNS).where(
             MoodEntry.user_pseudonym_id == current_user.pseudonym_id
         )
         
         # Apply date filters
         if start_date:
-            query = query.filter(MoodEntry.entry_date >= start_date)
+            query = query.where(MoodEntry.entry_date >= start_date)
         if end_date:
-            query = query.filter(MoodEntry.entry_date <= end_date)
-        
-        # Order by most recent first
-        query = query.order_by(desc(MoodEntry.recorded_at))
-        
-        # Apply pagination
-        entries = query.offset(offset).limit(limit).all()
-        
-        return [
-            MoodEntryResponse(
-                entry_id=entry.entry_id,
-                mood_score=entry.mood_score,
-                anxiety_level=entry.anxiety_level,
-                stress_level=entry.stress_level,
-                energy_level=entry.energy_level,
-                sleep_quality=entry.sleep_quality,
-                entry_date=entry.entry_date.isoformat(),
-                recorded_at=entry.recorded_at.isoformat(),
-                entry_method=entry.entry_method,
-                data_quality=entry.data_quality,
-                notes=entry.notes,
-                has_location=entry.location_point is not None,
-                is_research_eligible=entry.is_research_eligible
-            )
-            for entry in entries
-        ]
+            query = query.where(MoodEntry.entry_date <= end_date)
+        
+        # Most recent first, paginated
+        rows = (await db.execute(
+            query.order_by(desc(MoodEntry.recorded_at)).offset(offset).limit(limit)
+        )).all()
+        
+        # Validate the rows in one adapter call and return directly, skipping
+        # FastAPI's second response_model pass (response_model stays for the schema)
+        entries = mood_entry_list_adapter.validate_python(rows, from_attributes=True)
+        return ORJSONResponse(mood_entry_list_adapter.dump_python(entries))
         
     except Exception as e:
         logger.error(f"Failed to get mood entries: {e}")
@@ -271,7 +364,7 @@ async def get_mood_entry(
     request: Request,
     entry_id: str,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Get a specific mood entry by ID.
@@ -280,31 +373,17 @@ async def get_mood_entry(
     if it belongs to the authenticated user.
     """
     try:
-        entry = db.query(MoodEntry).filter(
-            and_(
+        row = (await db.execute(
+            select(*MOOD_ENTRY_COLUMNS).where(
                 MoodEntry.entry_id == entry_id,
                 MoodEntry.user_pseudonym_id == current_user.pseudonym_id
             )
-        ).first()
+        )).first()
         
-        if not entry:
+        if not row:
             raise ResourceNotFoundError("Mood entry", entry_id)
         
-        return MoodEntryResponse(
-            entry_id=entry.entry_id,
-            mood_score=entry.mood_score,
-            anxiety_level=entry.anxiety_level,
-            stress_level=entry.stress_level,
-            energy_level=entry.energy_level,
-            sleep_quality=entry.sleep_quality,
-            entry_date=entry.entry_date.isoformat(),
-            recorded_at=entry.recorded_at.isoformat(),
-            entry_method=entry.entry_method,
-            data_quality=entry.data_quality,
-            notes=entry.notes,
-            has_location=entry.location_point is not None,
-            is_research_eligible=entry.is_research_eligible
-        )
+        return MoodEntryResponse.model_validate(row, from_attributes=True)
         
     except HTTPException:
         raise
@@ -323,7 +402,7 @@ async def update_mood_entry(
     entry_id: str,
     mood_update: MoodEntryUpdate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Update an existing mood entry.
@@ -332,55 +411,59 @@ async def update_mood_entry(
     time window to correct mistakes or add additional information.
     """
     try:
-        entry = db.query(MoodEntry).filter(
-            and_(
-                MoodEntry.entry_id == entry_id,
-                MoodEntry.user_pseudonym_id == current_user.pseudonym_id
-            )
-        ).first()
-        
-        if not entry:
-            raise ResourceNotFoundError("Mood entry", entry_id)
+        now = datetime.now(timezone.utc)
+        changes = {
+            field: value
+            for field, value in mood_update.model_dump(exclude_unset=True).items()
+            if value is not None
+        }
         
-        # Check if entry is too old to modify (24 hours)
-        time_since_entry = datetime.now(timezone.utc) - entry.recorded_at
-        if time_since_entry.total_seconds() > 86400:  # 24 hours
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Cannot modify entries older than 24 hours"
+        # Update the entry in one statement; the self-join on the pre-update
+        # row lets RETURNING report the old values for the audit trail
+        previous = aliased(MoodEntry)
+        previous_row = (await db.execute(
+            update(MoodEntry)
+            .where(
+                MoodEntry.entry_id == previous.entry_id,
+                previous.entry_id == entry_id,
+                previous.user_pseudonym_id == current_user.pseudonym_id,
+                previous.recorded_at >= now - ENTRY_EDIT_WINDOW
             )
+            .values(
+                **changes,
+                is_modified=True,
+                modification_timestamp=now
+            )
+            .returning(previous.entry_id, *(getattr(previous, field) for field in changes))
+            .execution_options(synchronize_session=False)
+        )).first()
         
-        # Track what was updated
-        updated_fields = {}
-        
-        # Update fields
-        for field, value in mood_update.dict(exclude_unset=True).items():
-            if hasattr(entry, field) and value is not None:
-                old_value = getattr(entry, field)
-                setattr(entry, field, value)
-                updated_fields[field] = {"old": old_value, "new": value}
+        if previous_row is None:
+            await _raise_entry_not_modifiable(db, entry_id, current_user.pseudonym_id, "modify")
         
-        # Mark as modified
-        entry.is_modified = True
-        entry.modification_timestamp = datetime.now(timezone.utc)
+        # Track what was updated
+        updated_fields = {
+            field: {"old": old_value, "new": changes[field]}
+            for field, old_value in zip(changes, previous_row[1:])
+        }
         
-        db.commit()
+        await db.commit()
         
         # Log mood entry update
-        audit_log = AuditLog(
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
             user_pseudonym_id=current_user.pseudonym_id,
             event_type="mood_entry_updated",
             event_category="user_data",
             event_description="Mood entry updated",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "entry_id": entry_id,
                 "updated_fields": updated_fields
             }
         )
-        db.add(audit_log)
-        db.commit()
+        await invalidate_mood_trends(current_user.pseudonym_id)
         
         return {
             "message": "Mood entry updated successfully",
@@ -391,7 +474,7 @@ async def update_mood_entry(
         raise
     except Exception as e:
         logger.error(f"Failed to update mood entry: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update mood entry"
@@ -404,7 +487,7 @@ async def delete_mood_entry(
     request: Request,
     entry_id: str,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Delete a mood entry.
@@ -414,43 +497,39 @@ async def delete_mood_entry(
     as deleted rather than physically removed.
     """
     try:
-        entry = db.query(MoodEntry).filter(
-            and_(
+        # Remove the entry, returning what the audit trail needs
+        deleted = (await db.execute(
+            delete(MoodEntry)
+            .where(
                 MoodEntry.entry_id == entry_id,
-                MoodEntry.user_pseudonym_id == current_user.pseudonym_id
+                MoodEntry.user_pseudonym_id == current_user.pseudonym_id,
+                MoodEntry.recorded_at >= datetime.now(timezone.utc) - ENTRY_EDIT_WINDOW
             )
-        ).first()
+            .returning(MoodEntry.mood_score, MoodEntry.entry_date)
+            .execution_options(synchronize_session=False)
+        )).first()
         
-        if not entry:
-            raise ResourceNotFoundError("Mood entry", entry_id)
+        if deleted is None:
+            await _raise_entry_not_modifiable(db, entry_id, current_user.pseudonym_id, "delete")
         
-        # Check if entry is too old to delete (24 hours)
-        time_since_entry = datetime.now(timezone.utc) - entry.recorded_at
-        if time_since_entry.total_seconds() > 86400:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Cannot delete entries older than 24 hours"
-            )
+        await db.commit()
         
-        # Log deletion before removing
-        audit_log = AuditLog(
+        # Log deletion
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
             user_pseudonym_id=current_user.pseudonym_id,
             event_type="mood_entry_deleted",
             event_category="user_data",
             event_description="Mood entry deleted",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "entry_id": entry_id,
-                "original_mood_score": entry.mood_score,
-                "entry_date": entry.entry_date.isoformat()
+                "original_mood_score": deleted.mood_score,
+                "entry_date": deleted.entry_date.isoformat()
             }
         )
-        db.add(audit_log)
-        
-        # Remove the entry
-        db.delete(entry)
-        db.commit()
+        await invalidate_mood_trends(current_user.pseudonym_id)
         
         return {"message": "Mood entry deleted successfully"}
         
@@ -458,7 +537,7 @@ async def delete_mood_entry(
         raise
     except Exception as e:
         logger.error(f"Failed to delete mood entry: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete mood entry"
@@ -470,8 +549,8 @@ async def delete_mood_entry(
 async def get_mood_trends(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
-    period: str = Query("30d", regex="^(7d|30d|90d|1y)$", description="Time period for analysis"),
+    db: AsyncSession = Depends(get_db_async),
+    period: TrendPeriod = Query("30d", description="Time period for analysis"),
 ):
     """
     Get mood trends and analysis for the user.
@@ -480,30 +559,50 @@ async def get_mood_trends(
     about trends, variability, and correlations.
     """
     try:
+        cached = await _get_cached_trends(current_user.pseudonym_id, period)
+        if cached:
+            return cached
+        
         # Calculate date range based on period
         end_date = date.today()
-        if period == "7d":
-            days = 7
-        elif period == "30d":
-            days = 30
-        elif period == "90d":
-            days = 90
-        else:  # 1y
-            days = 365
-        
-        start_date = end_date - timedelta(days=days)
-        
-        # Get entries for the period
-        entries = db.query(MoodEntry).filter(
-            and_(
-                MoodEntry.user_pseudonym_id == current_user.pseudonym_id,
-                MoodEntry.entry_date >= start_date,
-                MoodEntry.entry_date <= end_date
+        start_date = end_date - timedelta(days=TREND_PERIOD_DAYS[period])
+        
+        # Rank entries from both ends of the period so the first/last week
+        # comparison can be aggregated alongside the other statistics
+        period_entries = select(
+            MoodEntry.mood_score,
+            MoodEntry.anxiety_level,
+            MoodEntry.stress_level,
+            MoodEntry.energy_level,
+            MoodEntry.sleep_quality,
+            func.row_number().over(order_by=MoodEntry.entry_date.asc()).label('first_rank'),
+            func.row_number().over(order_by=MoodEntry.entry_date.desc()).label('last_rank')
+        ).where(
+            MoodEntry.user_pseudonym_id == current_user.pseudonym_id,
+            MoodEntry.entry_date >= start_date,
+            MoodEntry.entry_date <= end_date
+        ).subquery()
+        
+        stats = (await db.execute(
+            select(
+                func.count().label('total_entries'),
+                func.avg(period_entries.c.mood_score).label('average_mood'),
+                func.stddev_pop(period_entries.c.mood_score).label('mood_variability'),
+                func.avg(period_entries.c.mood_score).filter(
+                    period_entries.c.last_rank <= TREND_WINDOW_ENTRIES
+                ).label('recent_average'),
+                func.avg(period_entries.c.mood_score).filter(
+                    period_entries.c.first_rank <= TREND_WINDOW_ENTRIES
+                ).label('older_average'),
+                func.avg(period_entries.c.anxiety_level).label('anxiety_average'),
+                func.avg(period_entries.c.stress_level).label('stress_average'),
+                func.avg(period_entries.c.energy_level).label('energy_average'),
+                func.avg(period_entries.c.sleep_quality).label('sleep_average')
             )
-        ).all()
+        )).one()
         
-        if not entries:
-            return MoodTrendsResponse(
+        if not stats.total_entries:
+            trends = MoodTrendsResponse(
                 period=period,
                 average_mood=0.0,
                 mood_trend="insufficient_data",
@@ -514,46 +613,31 @@ async def get_mood_trends(
                 energy_average=None,
                 sleep_average=None
             )
-        
-        # Calculate basic statistics
-        mood_scores = [entry.mood_score for entry in entries]
-        avg_mood = sum(mood_scores) / len(mood_scores)
-        mood_variability = calculate_variability(mood_scores)
-        
-        # Calculate trend (simplified)
-        recent_entries = sorted(entries, key=lambda x: x.entry_date)[-7:]  # Last week
-        older_entries = sorted(entries, key=lambda x: x.entry_date)[:7]   # First week
-        
-        if len(recent_entries) > 0 and len(older_entries) > 0:
-            recent_avg = sum(e.mood_score for e in recent_entries) / len(recent_entries)
-            older_avg = sum(e.mood_score for e in older_entries) / len(older_entries)
-            
+        else:
+            # Calculate trend (simplified): last week of entries vs first week
+            recent_avg = float(stats.recent_average)
+            older_avg = float(stats.older_average)
             if recent_avg > older_avg + 0.5:
                 trend = "improving"
             elif recent_avg < older_avg - 0.5:
                 trend = "declining"
             else:
                 trend = "stable"
-        else:
-            trend = "insufficient_data"
-        
-        # Calculate averages for other metrics
-        anxiety_scores = [e.anxiety_level for e in entries if e.anxiety_level is not None]
-        stress_scores = [e.stress_level for e in entries if e.stress_level is not None]
-        energy_scores = [e.energy_level for e in entries if e.energy_level is not None]
-        sleep_scores = [e.sleep_quality for e in entries if e.sleep_quality is not None]
-        
-        return MoodTrendsResponse(
-            period=period,
-            average_mood=round(avg_mood, 2),
-            mood_trend=trend,
-            total_entries=len(entries),
-            mood_variability=round(mood_variability, 2),
-            anxiety_average=round(sum(anxiety_scores) / len(anxiety_scores), 2) if anxiety_scores else None,
-            stress_average=round(sum(stress_scores) / len(stress_scores), 2) if stress_scores else None,
-            energy_average=round(sum(energy_scores) / len(energy_scores), 2) if energy_scores else None,
-            sleep_average=round(sum(sleep_scores) / len(sleep_scores), 2) if sleep_scores else None
-        )
+            
+            trends = MoodTrendsResponse(
+                period=period,
+                average_mood=_round_stat(stats.average_mood),
+                mood_trend=trend,
+                total_entries=stats.total_entries,
+                mood_variability=_round_stat(stats.mood_variability) or 0.0,
+                anxiety_average=_round_stat(stats.anxiety_average),
+                stress_average=_round_stat(stats.stress_average),
+                energy_average=_round_stat(stats.energy_average),
+                sleep_average=_round_stat(stats.sleep_average)
+            )
+        
+        await _cache_trends(current_user.pseudonym_id, trends)
+        return trends
         
     except Exception as e:
         logger.error(f"Failed to get mood trends: {e}")
@@ -563,11 +647,8 @@ async def get_mood_trends(
         )
 
 
-def calculate_variability(scores: List[int]) -> float:
-    """Calculate mood variability (standard deviation)."""
-    if len(scores) < 2:
-        return 0.0
-    
-    mean = sum(scores) / len(scores)
-    variance = sum((score - mean) ** 2 for score in scores) / len(scores)
-    return variance ** 0.5
\ No newline at end of file
+def _round_stat(value) -> Optional[float]:
+    """Round a NUMERIC aggregate to two places, keeping NULL as None."""
+    if value is None:
+        return None
+    return round(float(value), 2)
@@ -5,24 +5,39 @@ Handles personalized resource recommendations with bias detection.
 
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
-from pydantic import BaseModel, validator, Field
-from sqlalchemy.orm import Session
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.auth import get_current_consented_user, AuthenticatedUser
 from core.config import settings
 from core.exceptions import ResourceNotFoundError
-from database.base import get_db
+from core.middleware import create_route_limiter, get_pseudonym_identifier
+from database.base import get_db_async
 from database.models.resource_recommendation import ResourceRecommendation
-from database.models.audit_log import AuditLog
+from core.audit_queue import client_metadata, enqueue_audit_log
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(default_response_class=ORJSONResponse)
+limiter = create_route_limiter(key_func=get_pseudonym_identifier)
+
+# Only the columns RecommendationResponse needs, in field order
+RECOMMENDATION_COLUMNS = (
+    ResourceRecommendation.recommendation_id,
+    ResourceRecommendation.resource_type,
+    ResourceRecommendation.resource_title,
+    ResourceRecommendation.resource_description,
+    ResourceRecommendation.confidence_score,
+    ResourceRecommendation.status,
+    ResourceRecommendation.engagement_score,
+    ResourceRecommendation.recommended_at,
+    ResourceRecommendation.algorithm_type,
+    ResourceRecommendation.bias_risk_level,
+)
 
 
 class RecommendationResponse(BaseModel):
@@ -34,9 +49,14 @@ class RecommendationResponse(BaseModel):
     confidence_score: float
     status: str
     engagement_score: Optional[float]
-    recommended_at: str
+    recommended_at: datetime
     algorithm_type: str
     bias_risk_level: str
+    
+    model_config = ConfigDict(extra='ignore', from_attributes=True, validate_assignment=False)
+
+
+recommendation_list_adapter = TypeAdapter(List[RecommendationResponse])
 
 
 class RecommendationFeedback(BaseModel):
@@ -44,13 +64,7 @@ class RecommendationFeedback(BaseModel):
     helpful: bool
     engagement_level: int = Field(..., ge=1, le=5)
     feedback_text: Optional[str] = Field(None, max_length=500)
-    action_taken: Optional[str] = None
-    
-    @validator('action_taken')
-    def validate_action(cls, v):
-        if v and v not in ['viewed', 'clicked', 'engaged', 'completed', 'dismissed', 'saved']:
-            raise ValueError('Invalid action type')
-        return v
+    action_taken: Optional[Literal['viewed', 'clicked', 'engaged', 'completed', 'dismissed', 'saved']] = None
 
 
 @router.get("/", response_model=List[RecommendationResponse])
@@ -58,38 +72,25 @@ class RecommendationFeedback(BaseModel):
 async def get_recommendations(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_consented_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db_async),
     limit: int = Query(10, le=50),
     resource_type: Optional[str] = Query(None)
 ):
     """Get personalized recommendations for the user."""
     try:
-        query = db.query(ResourceRecommendation).filter(
+        query = select(*RECOMMENDATION_COLUMNS).where(
             ResourceRecommendation.user_pseudonym_id == current_user.pseudonym_id
         )
         
         if resource_type:
-            query = query.filter(ResourceRecommendation.resource_type == resource_type)
+            query = query.where(ResourceRecommendation.resource_type == resource_type)
         
-        recommendations = query.order_by(
-            ResourceRecommendation.recommended_at.desc()
-        ).limit(limit).all()
+        rows = (await db.execute(
+            query.order_by(ResourceRecommendation.recommended_at.desc()).limit(limit)
+        )).all()
         
-        return [
-            RecommendationResponse(
-                recommendation_id=rec.recommendation_id,
-                resource_type=rec.resource_type,
-                resource_title=rec.resource_title,
-                resource_description=rec.resource_description,
-                confidence_score=rec.confidence_score,
-                status=rec.status,
-                engagement_score=rec.engagement_score,
-                recommended_at=rec.recommended_at.isoformat(),
-                algorithm_type=rec.algorithm_type,
-                bias_risk_level=rec.bias_risk_level
-            )
-            for rec in recommendations
-        ]
+        recommendations = recommendation_list_adapter.validate_python(rows, from_attributes=True)
+        return ORJSONResponse(recommendation_list_adapter.dump_python(recommendations))
         
     except Exception as e:
         logger.error(f"Failed to get recommendations: {e}")
@@ -106,14 +107,16 @@ async def submit_recommendation_feedback(
     recommendation_id: str,
     feedback: RecommendationFeedback,
     current_user: AuthenticatedUser = Depends(get_current_consented_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """Submit feedback on a recommendation."""
     try:
-        recommendation = db.query(ResourceRecommendation).filter(
-            ResourceRecommendation.recommendation_id == recommendation_id,
-            ResourceRecommendation.user_pseudonym_id == current_user.pseudonym_id
-        ).first()
+        recommendation = (await db.execute(
+            select(ResourceRecommendation).where(
+                ResourceRecommendation.recommendation_id == recommendation_id,
+                ResourceRecommendation.user_pseudonym_id == current_user.pseudonym_id
+            )
+        )).scalar_one_or_none()
         
         if not recommendation:
             raise ResourceNotFoundError("Recommendation", recommendation_id)
@@ -123,16 +126,17 @@ async def submit_recommendation_feedback(
         if feedback.action_taken:
             recommendation.status = feedback.action_taken
         
-        db.commit()
+        await db.commit()
         
         # Log feedback
-        audit_log = AuditLog(
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
             user_pseudonym_id=current_user.pseudonym_id,
             event_type="recommendation_feedback",
             event_category="user_interaction",
             event_description="User provided recommendation feedback",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "recommendation_id": recommendation_id,
                 "helpful": feedback.helpful,
@@ -140,8 +144,6 @@ async def submit_recommendation_feedback(
                 "action_taken": feedback.action_taken
             }
         )
-        db.add(audit_log)
-        db.commit()
         
         return {"message": "Feedback submitted successfully"}
         
@@ -149,6 +151,7 @@ async def submit_recommendation_feedback(
         raise
     except Exception as e:
         logger.error(f"Failed to submit feedback: {e}")
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to submit feedback"
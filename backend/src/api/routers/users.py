@@ -4,14 +4,17 @@ Handles user profiles, preferences, and HIPAA-compliant data operations.
 """
 
 import logging
-from datetime import datetime, timezone
+import re
+import zoneinfo
+from datetime import datetime
+from enum import Enum
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
-from pydantic import BaseModel, validator
-from sqlalchemy.orm import Session
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationInfo, field_validator
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.auth import (
     get_current_active_user,
@@ -21,14 +24,74 @@ from core.auth import (
 )
 from core.config import settings
 from core.exceptions import ResourceNotFoundError, ValidationError, ConsentRequiredError
-from database.base import get_db
+from core.middleware import create_route_limiter, get_pseudonym_identifier
+from database.base import get_db_async
 from database.models.user import User, DemographicCategory, GenderIdentity, RaceEthnicity
 from database.models.social_determinants import SocialDeterminants
-from database.models.audit_log import AuditLog
+from core.audit_queue import client_metadata, enqueue_audit_log
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
-limiter = Limiter(key_func=get_remote_address)
+router = APIRouter(default_response_class=ORJSONResponse)
+# Sliding window: the low write limits (3/hour on /account) can't be doubled
+# by bursting across a fixed-window boundary
+limiter = create_route_limiter(key_func=get_pseudonym_identifier, strategy="moving-window")
+
+# UserPreferencesUpdate fields that map to User columns
+PERSISTED_PREFERENCE_FIELDS = frozenset({'data_sharing_consent'})
+
+# ISO 639-1 language, optionally with an ISO 3166-1 region ("en", "en-US")
+LANGUAGE_CODE_PATTERN = re.compile(r'^[a-zA-Z]{2}(-[a-zA-Z]{2})?$')
+
+# IANA zone names, loaded once for O(1) membership checks
+VALID_TIMEZONES = frozenset(zoneinfo.available_timezones())
+
+# Column projections for the read endpoints; no full ORM entities are loaded
+PROFILE_COLUMNS = (
+    User.pseudonym_id,
+    User.age_group,
+    User.gender_identity,
+    User.race_ethnicity,
+    User.is_active,
+    User.is_consented,
+    User.engagement_score,
+    User.preferred_language,
+    User.timezone,
+    User.last_login,
+    User.created_at,
+)
+
+PREFERENCES_COLUMNS = (
+    User.data_sharing_consent,
+    User.research_participation_consent,
+    User.is_consented,
+    User.consent_version_id,
+    User.engagement_score,
+)
+
+SOCIAL_DETERMINANTS_COLUMNS = (
+    SocialDeterminants.income_level,
+    SocialDeterminants.education_level,
+    SocialDeterminants.employment_status,
+    SocialDeterminants.insurance_status,
+    SocialDeterminants.housing_status,
+    SocialDeterminants.has_mental_health_provider,
+    SocialDeterminants.social_support_level,
+    SocialDeterminants.experiences_discrimination,
+    SocialDeterminants.financial_stress_level,
+    SocialDeterminants.neighborhood_safety_rating,
+    SocialDeterminants.data_collection_date,
+)
+
+# Read statements built once at import and bound per request by pseudonym_id
+PROFILE_QUERY = select(*PROFILE_COLUMNS).where(
+    User.pseudonym_id == bindparam('pseudonym_id')
+)
+PREFERENCES_QUERY = select(*PREFERENCES_COLUMNS).where(
+    User.pseudonym_id == bindparam('pseudonym_id')
+)
+SOCIAL_DETERMINANTS_QUERY = select(*SOCIAL_DETERMINANTS_COLUMNS).where(
+    SocialDeterminants.user_pseudonym_id == bindparam('pseudonym_id')
+)
 
 
 class UserProfileUpdate(BaseModel):
@@ -39,22 +102,21 @@ class UserProfileUpdate(BaseModel):
     preferred_language: Optional[str] = None
     timezone: Optional[str] = None
     
-    @validator('preferred_language')
+    # Unknown keys are rejected up front instead of being validated and dropped
+    model_config = ConfigDict(extra='forbid')
+    
+    @field_validator('preferred_language')
+    @classmethod
     def validate_language(cls, v):
-        if v and len(v) not in [2, 5]:  # ISO language codes
+        if v and not LANGUAGE_CODE_PATTERN.match(v):
             raise ValueError('Language code must be in ISO format (e.g., "en" or "en-US")')
         return v
     
-    @validator('timezone')
+    @field_validator('timezone')
+    @classmethod
     def validate_timezone(cls, v):
-        if v:
-            # Basic timezone validation - in production, use pytz
-            valid_timezones = [
-                'UTC', 'America/New_York', 'America/Chicago', 
-                'America/Denver', 'America/Los_Angeles', 'Europe/London'
-            ]
-            if v not in valid_timezones:
-                raise ValueError(f'Timezone must be one of: {valid_timezones}')
+        if v and v not in VALID_TIMEZONES:
+            raise ValueError('Timezone must be a valid IANA timezone name (e.g., "America/New_York")')
         return v
 
 
@@ -65,7 +127,10 @@ class UserPreferencesUpdate(BaseModel):
     notification_preferences: Optional[dict] = None
     privacy_level: Optional[str] = None
     
-    @validator('privacy_level')
+    model_config = ConfigDict(extra='forbid')
+    
+    @field_validator('privacy_level')
+    @classmethod
     def validate_privacy_level(cls, v):
         if v and v not in ['minimal', 'standard', 'enhanced']:
             raise ValueError('Privacy level must be minimal, standard, or enhanced')
@@ -85,26 +150,52 @@ class SocialDeterminantsUpdate(BaseModel):
     financial_stress_level: Optional[int] = None
     neighborhood_safety_rating: Optional[int] = None
     
-    @validator('social_support_level', 'financial_stress_level', 'neighborhood_safety_rating')
-    def validate_ratings(cls, v, field):
+    model_config = ConfigDict(extra='forbid')
+    
+    @field_validator('social_support_level', 'financial_stress_level', 'neighborhood_safety_rating')
+    @classmethod
+    def validate_ratings(cls, v, info: ValidationInfo):
         if v is not None and not (1 <= v <= 5):
-            raise ValueError(f'{field.name} must be between 1 and 5')
+            raise ValueError(f'{info.field_name} must be between 1 and 5')
         return v
 
 
 class UserResponse(BaseModel):
     """Response model for user data."""
     pseudonym_id: str
-    age_group: Optional[str]
-    gender_identity: Optional[str]
-    race_ethnicity: Optional[str]
+    age_group: Optional[DemographicCategory]
+    gender_identity: Optional[GenderIdentity]
+    race_ethnicity: Optional[RaceEthnicity]
     is_active: bool
     is_consented: bool
     engagement_score: float
     preferred_language: str
     timezone: str
-    last_login: Optional[str]
-    created_at: str
+    last_login: Optional[datetime]
+    created_at: Optional[datetime]
+    
+    # Enum members are serialized to their .value strings
+    model_config = ConfigDict(from_attributes=True)
+
+
+user_response_adapter = TypeAdapter(UserResponse)
+
+
+async def get_db_user(
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db_async)
+) -> User:
+    """
+    Load the authenticated user's User row in the request's session.
+    
+    FastAPI caches dependency results per request, so this shares the
+    get_db_async session the auth dependencies used and db.get is served
+    from its identity map.
+    """
+    user = await db.get(User, current_user.pseudonym_id)
+    if not user:
+        raise ResourceNotFoundError("User", current_user.pseudonym_id)
+    return user
 
 
 @router.get("/profile", response_model=UserResponse)
@@ -112,7 +203,7 @@ class UserResponse(BaseModel):
 async def get_user_profile(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Get current user's profile information.
@@ -121,23 +212,16 @@ async def get_user_profile(
     preferences, and account status.
     """
     try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
+        user = (await db.execute(
+            PROFILE_QUERY, {"pseudonym_id": current_user.pseudonym_id}
+        )).first()
         if not user:
             raise ResourceNotFoundError("User", current_user.pseudonym_id)
         
-        return UserResponse(
-            pseudonym_id=user.pseudonym_id,
-            age_group=user.age_group.value if user.age_group else None,
-            gender_identity=user.gender_identity.value if user.gender_identity else None,
-            race_ethnicity=user.race_ethnicity.value if user.race_ethnicity else None,
-            is_active=user.is_active,
-            is_consented=user.is_consented,
-            engagement_score=user.engagement_score,
-            preferred_language=user.preferred_language,
-            timezone=user.timezone,
-            last_login=user.last_login.isoformat() if user.last_login else None,
-            created_at=user.created_at.isoformat() if user.created_at else None
-        )
+        # Validate and dump through the prebuilt adapter, returning directly so
+        # FastAPI skips its second response_model pass (kept for the schema)
+        profile = user_response_adapter.validate_python(user, from_attributes=True)
+        return ORJSONResponse(user_response_adapter.dump_python(profile))
         
     except HTTPException:
         raise
@@ -155,7 +239,7 @@ async def update_user_profile(
     request: Request,
     profile_data: UserProfileUpdate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Update user profile information.
@@ -164,48 +248,43 @@ async def update_user_profile(
     language preferences, and timezone settings.
     """
     try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if not user:
-            raise ResourceNotFoundError("User", current_user.pseudonym_id)
-        
-        # Track what fields were updated for audit logging
-        updated_fields = {}
-        
-        # Update profile fields
-        if profile_data.age_group is not None:
-            user.age_group = profile_data.age_group
-            updated_fields['age_group'] = profile_data.age_group.value
-        
-        if profile_data.gender_identity is not None:
-            user.gender_identity = profile_data.gender_identity
-            updated_fields['gender_identity'] = profile_data.gender_identity.value
-        
-        if profile_data.race_ethnicity is not None:
-            user.race_ethnicity = profile_data.race_ethnicity
-            updated_fields['race_ethnicity'] = profile_data.race_ethnicity.value
+        # Walk only the fields the client sent rather than dumping the model
+        changes = {
+            field: value for field in profile_data.model_fields_set
+            if (value := getattr(profile_data, field)) is not None
+        }
+        if not changes:
+            return {"message": "Profile updated successfully", "updated_fields": []}
         
-        if profile_data.preferred_language is not None:
-            user.preferred_language = profile_data.preferred_language
-            updated_fields['preferred_language'] = profile_data.preferred_language
+        # Track what fields were updated for audit logging (enums as their values)
+        updated_fields = {
+            field: value.value if isinstance(value, Enum) else value
+            for field, value in changes.items()
+        }
         
-        if profile_data.timezone is not None:
-            user.timezone = profile_data.timezone
-            updated_fields['timezone'] = profile_data.timezone
+        # Update and existence check in one statement; no user row is loaded
+        updated = (await db.execute(
+            update(User)
+            .where(User.pseudonym_id == current_user.pseudonym_id)
+            .values(**changes)
+            .returning(User.pseudonym_id)
+        )).first()
+        if not updated:
+            raise ResourceNotFoundError("User", current_user.pseudonym_id)
         
-        db.commit()
+        await db.commit()
         
         # Log profile update
-        audit_log = AuditLog(
-            user_pseudonym_id=user.pseudonym_id,
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
+            user_pseudonym_id=current_user.pseudonym_id,
             event_type="profile_updated",
             event_category="user_management",
             event_description="User profile updated",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={"updated_fields": updated_fields}
         )
-        db.add(audit_log)
-        db.commit()
         
         return {"message": "Profile updated successfully", "updated_fields": list(updated_fields.keys())}
         
@@ -213,7 +292,7 @@ async def update_user_profile(
         raise
     except Exception as e:
         logger.error(f"Failed to update user profile: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update user profile"
@@ -225,7 +304,7 @@ async def update_user_profile(
 async def get_user_preferences(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Get user preferences and privacy settings.
@@ -234,7 +313,9 @@ async def get_user_preferences(
     and consent status.
     """
     try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
+        user = (await db.execute(
+            PREFERENCES_QUERY, {"pseudonym_id": current_user.pseudonym_id}
+        )).first()
         if not user:
             raise ResourceNotFoundError("User", current_user.pseudonym_id)
         
@@ -264,7 +345,7 @@ async def update_user_preferences(
     request: Request,
     preferences_data: UserPreferencesUpdate,
     current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Update user preferences and privacy settings.
@@ -273,33 +354,35 @@ async def update_user_preferences(
     consent settings, and notification preferences.
     """
     try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
+        # Only consent flags are persisted on User; other preferences would go here
+        updated_fields = {
+            field: value
+            for field in preferences_data.model_fields_set & PERSISTED_PREFERENCE_FIELDS
+            if (value := getattr(preferences_data, field)) is not None
+        }
+        if not updated_fields:
+            return {"message": "Preferences updated successfully", "updated_fields": []}
+        
+        user = await db.get(User, current_user.pseudonym_id)
         if not user:
             raise ResourceNotFoundError("User", current_user.pseudonym_id)
         
-        updated_fields = {}
+        for field, value in updated_fields.items():
+            setattr(user, field, value)
         
-        # Update consent preferences
-        if preferences_data.data_sharing_consent is not None:
-            user.data_sharing_consent = preferences_data.data_sharing_consent
-            updated_fields['data_sharing_consent'] = preferences_data.data_sharing_consent
-        
-        # Update other preferences would go here
-        
-        db.commit()
+        await db.commit()
         
         # Log preferences update
-        audit_log = AuditLog(
-            user_pseudonym_id=user.pseudonym_id,
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
+            user_pseudonym_id=current_user.pseudonym_id,
             event_type="preferences_updated",
             event_category="privacy",
             event_description="User preferences updated",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={"updated_fields": updated_fields}
         )
-        db.add(audit_log)
-        db.commit()
         
         return {"message": "Preferences updated successfully", "updated_fields": list(updated_fields.keys())}
         
@@ -307,7 +390,7 @@ async def update_user_preferences(
         raise
     except Exception as e:
         logger.error(f"Failed to update user preferences: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update user preferences"
@@ -319,7 +402,7 @@ async def update_user_preferences(
 async def get_social_determinants(
     request: Request,
     current_user: AuthenticatedUser = Depends(get_current_consented_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Get user's social determinants of health data.
@@ -328,9 +411,9 @@ async def get_social_determinants(
     Requires research participation consent.
     """
     try:
-        sdoh = db.query(SocialDeterminants).filter(
-            SocialDeterminants.user_pseudonym_id == current_user.pseudonym_id
-        ).first()
+        sdoh = (await db.execute(
+            SOCIAL_DETERMINANTS_QUERY, {"pseudonym_id": current_user.pseudonym_id}
+        )).first()
         
         if not sdoh:
             return {"message": "No social determinants data available"}
@@ -346,7 +429,7 @@ async def get_social_determinants(
             "experiences_discrimination": sdoh.experiences_discrimination,
             "financial_stress_level": sdoh.financial_stress_level,
             "neighborhood_safety_rating": sdoh.neighborhood_safety_rating,
-            "data_collection_date": sdoh.data_collection_date.isoformat() if sdoh.data_collection_date else None
+            "data_collection_date": sdoh.data_collection_date
         }
         
     except HTTPException:
@@ -365,7 +448,7 @@ async def update_social_determinants(
     request: Request,
     sdoh_data: SocialDeterminantsUpdate,
     current_user: AuthenticatedUser = Depends(get_current_consented_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Update user's social determinants of health data.
@@ -374,58 +457,61 @@ async def update_social_determinants(
     for research purposes. Requires research consent.
     """
     try:
-        # Get or create SDOH record
-        sdoh = db.query(SocialDeterminants).filter(
-            SocialDeterminants.user_pseudonym_id == current_user.pseudonym_id
-        ).first()
-        
-        if not sdoh:
-            sdoh = SocialDeterminants(
-                user_pseudonym_id=current_user.pseudonym_id,
-                data_collection_date=datetime.now(timezone.utc)
-            )
-            db.add(sdoh)
-        
-        updated_fields = {}
-        
-        # Update SDOH fields
-        for field, value in sdoh_data.dict(exclude_unset=True).items():
-            if hasattr(sdoh, field) and value is not None:
-                setattr(sdoh, field, value)
-                updated_fields[field] = value
-        
-        # Update data collection date
-        sdoh.data_collection_date = datetime.now(timezone.utc)
+        updated_fields = {
+            field: value for field in sdoh_data.model_fields_set
+            if (value := getattr(sdoh_data, field)) is not None
+        }
+        if not updated_fields:
+            return {
+                "message": "Social determinants data updated successfully",
+                "updated_fields": [],
+                "data_collection_date": None
+            }
         
-        db.commit()
+        # Update the SDOH record, or create it on first submission; Postgres
+        # stamps the collection date and hands it back via RETURNING
+        values = dict(updated_fields, data_collection_date=func.now())
+        data_collection_date = (await db.execute(
+            update(SocialDeterminants)
+            .where(SocialDeterminants.user_pseudonym_id == current_user.pseudonym_id)
+            .values(**values)
+            .returning(SocialDeterminants.data_collection_date)
+        )).scalar()
+        if data_collection_date is None:
+            data_collection_date = (await db.execute(
+                insert(SocialDeterminants)
+                .values(user_pseudonym_id=current_user.pseudonym_id, **values)
+                .returning(SocialDeterminants.data_collection_date)
+            )).scalar_one()
+        
+        await db.commit()
         
         # Log SDOH update
-        audit_log = AuditLog(
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
             user_pseudonym_id=current_user.pseudonym_id,
             event_type="sdoh_updated",
             event_category="research_data",
             event_description="Social determinants of health data updated",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
+            ip_address=ip_address,
+            user_agent=user_agent,
             additional_data={
                 "updated_fields": updated_fields,
                 "research_eligible": True
             }
         )
-        db.add(audit_log)
-        db.commit()
         
         return {
             "message": "Social determinants data updated successfully",
             "updated_fields": list(updated_fields.keys()),
-            "data_collection_date": sdoh.data_collection_date.isoformat()
+            "data_collection_date": data_collection_date
         }
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Failed to update social determinants: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update social determinants data"
@@ -436,8 +522,8 @@ async def update_social_determinants(
 @limiter.limit("3/hour")
 async def delete_user_account(
     request: Request,
-    current_user: AuthenticatedUser = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    user: User = Depends(get_db_user),
+    db: AsyncSession = Depends(get_db_async)
 ):
     """
     Delete user account and all associated data.
@@ -446,25 +532,11 @@ async def delete_user_account(
     research data integrity and compliance requirements.
     """
     try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if not user:
-            raise ResourceNotFoundError("User", current_user.pseudonym_id)
-        
-        # Log account deletion request
-        audit_log = AuditLog(
-            user_pseudonym_id=user.pseudonym_id,
-            event_type="account_deletion_requested",
-            event_category="privacy",
-            event_description="User requested account deletion",
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            additional_data={
-                "research_data_present": user.research_participation_consent,
-                "consented": user.is_consented
-            }
-        )
-        db.add(audit_log)
-        db.commit()
+        pseudonym_id = user.pseudonym_id
+        deletion_context = {
+            "research_data_present": user.research_participation_consent,
+            "consented": user.is_consented
+        }
         
         # In a production system, this would:
         # 1. Check if user has research data that must be retained
@@ -475,7 +547,19 @@ async def delete_user_account(
         # For now, mark as inactive instead of hard delete
         user.is_active = False
         user.engagement_score = 0.0
-        db.commit()
+        await db.commit()
+        
+        # Log account deletion request
+        ip_address, user_agent = client_metadata(request)
+        enqueue_audit_log(
+            user_pseudonym_id=pseudonym_id,
+            event_type="account_deletion_requested",
+            event_category="privacy",
+            event_description="User requested account deletion",
+            ip_address=ip_address,
+            user_agent=user_agent,
+            additional_data=deletion_context
+        )
         
         return {
             "message": "Account deactivation initiated",
@@ -487,7 +571,7 @@ async def delete_user_account(
         raise
     except Exception as e:
         logger.error(f"Failed to delete user account: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process account deletion request"
@@ -0,0 +1,160 @@
+"""
+Asynchronous audit log writer for MindMap Research API.
+Queues audit events in memory and persists them in batches off the request path.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import insert
+
+from .config import settings
+from database.base import SessionLocal
+from database.models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many events are pending or the oldest has waited this long
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.05
+
+# A failed batch is retried with exponential backoff before being spilled to disk
+AUDIT_WRITE_ATTEMPTS = 3
+AUDIT_RETRY_BACKOFF_SECONDS = 0.5
+
+# Built once so SQLAlchemy reuses the compiled statement
+AUDIT_LOG_INSERT = insert(AuditLog)
+
+audit_q: asyncio.Queue = asyncio.Queue()
+_writer_task: Optional[asyncio.Task] = None
+
+
+def client_metadata(request) -> Tuple[str, str]:
+    """Return the (ip_address, user_agent) pair recorded on audit log rows."""
+    client = request.client
+    return (
+        client.host if client else "unknown",
+        request.headers.get("user-agent", "unknown")
+    )
+
+
+def insert_audit_log(db, **fields: Any) -> None:
+    """Add an audit log row to the session's transaction without ORM unit-of-work overhead."""
+    db.execute(AUDIT_LOG_INSERT, [fields])
+
+
+async def insert_audit_log_async(db, **fields: Any) -> None:
+    """insert_audit_log for an AsyncSession."""
+    await db.execute(AUDIT_LOG_INSERT, [fields])
+
+
+def enqueue_audit_log(**fields: Any) -> None:
+    """Queue an audit log row (AuditLog column values) for batched insertion."""
+    audit_q.put_nowait(fields)
+
+
+def _spill_batch(batch: List[Dict[str, Any]]) -> None:
+    """Append audit rows the database rejected to the fallback log, one JSON object per line."""
+    try:
+        os.makedirs(os.path.dirname(settings.AUDIT_FALLBACK_LOG_PATH) or ".", exist_ok=True)
+        with open(settings.AUDIT_FALLBACK_LOG_PATH, "ab") as fallback:
+            for row in batch:
+                fallback.write(orjson.dumps(row, default=str, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+        logger.error(
+            f"Wrote {len(batch)} audit log entries to {settings.AUDIT_FALLBACK_LOG_PATH} for replay"
+        )
+    except Exception as e:
+        # Last resort: keep the rows in the application log so the trail can be rebuilt
+        logger.critical(f"Failed to spill {len(batch)} audit log entries ({e}): {batch!r}")
+
+
+def _write_batch(batch: List[Dict[str, Any]]) -> None:
+    """Insert a batch of audit rows in a single transaction, retrying before spilling to disk."""
+    for attempt in range(1, AUDIT_WRITE_ATTEMPTS + 1):
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(AuditLog, batch)
+            db.commit()
+            return
+        except Exception as e:
+            db.rollback()
+            logger.warning(
+                f"Failed to persist {len(batch)} audit log entries "
+                f"(attempt {attempt}/{AUDIT_WRITE_ATTEMPTS}): {e}"
+            )
+        finally:
+            db.close()
+        
+        if attempt < AUDIT_WRITE_ATTEMPTS:
+            time.sleep(AUDIT_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    
+    _spill_batch(batch)
+
+
+async def _collect_batch(batch: List[Dict[str, Any]]):
+    """Wait for the next audit event, then gather more until the batch is full or stale."""
+    loop = asyncio.get_running_loop()
+    batch.append(await audit_q.get())
+    deadline = loop.time() + AUDIT_FLUSH_INTERVAL_SECONDS
+
+    while len(batch) < AUDIT_BATCH_SIZE:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(audit_q.get(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+
+
+async def _audit_writer():
+    """Background loop draining the audit queue into the database."""
+    loop = asyncio.get_running_loop()
+    batch: List[Dict[str, Any]] = []
+    try:
+        while True:
+            await _collect_batch(batch)
+            pending, batch = batch, []
+            await loop.run_in_executor(None, _write_batch, pending)
+    except asyncio.CancelledError:
+        # Don't lose events already taken off the queue
+        if batch:
+            _write_batch(batch)
+        raise
+
+
+def _drain_pending() -> List[Dict[str, Any]]:
+    """Take every event still waiting in the queue."""
+    pending = []
+    while not audit_q.empty():
+        pending.append(audit_q.get_nowait())
+    return pending
+
+
+def start_audit_writer():
+    """Start the background audit writer task."""
+    global _writer_task
+    if _writer_task is None or _writer_task.done():
+        _writer_task = asyncio.get_running_loop().create_task(_audit_writer())
+        logger.info("Audit log writer started")
+
+
+async def stop_audit_writer():
+    """Stop the background writer and flush any events still queued."""
+    global _writer_task
+    if _writer_task is not None:
+        _writer_task.cancel()
+        try:
+            await _writer_task
+        except asyncio.CancelledError:
+            pass
+        _writer_task = None
+
+    pending = _drain_pending()
+    if pending:
+        _write_batch(pending)
+    logger.info(f"Audit log writer stopped ({len(pending)} pending entries flushed)")
@@ -3,23 +3,35 @@ Authentication system for MindMap Research API.
 Supports Firebase Authentication and JWT tokens with research-grade security.
 """
 
+import asyncio
+import hashlib
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, Union
 from functools import wraps
 
 import firebase_admin
+import orjson
+import redis
+from cachetools import TTLCache
 from firebase_admin import auth as firebase_auth, credentials
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
+from .audit_queue import insert_audit_log_async
 from .config import settings
-from database.base import SessionLocal
+from .middleware import async_redis_client
+from database.base import get_db_async
 from database.models.user import User
-from database.models.audit_log import AuditLog
 from database.utils.pseudonymization import pseudonymizer
 
 logger = logging.getLogger(__name__)
@@ -30,6 +42,43 @@ security = HTTPBearer(auto_error=False)
 # Firebase initialization
 _firebase_app = None
 
+# Recently verified JWTs keyed by SHA-256 of the token, stored as (TokenData, expires_at)
+_jwt_cache = TTLCache(maxsize=settings.JWT_CACHE_SIZE, ttl=settings.JWT_CACHE_TTL)
+_jwt_cache_lock = threading.Lock()
+
+# Recently verified Firebase ID tokens, same keying, stored as (user_info, expires_at)
+_firebase_token_cache = TTLCache(
+    maxsize=settings.FIREBASE_TOKEN_CACHE_SIZE, ttl=settings.FIREBASE_TOKEN_CACHE_TTL
+)
+_firebase_token_cache_lock = threading.Lock()
+# Redis copy of the same entries, so every worker benefits from one verification
+FIREBASE_TOKEN_REDIS_PREFIX = "firebase:verify:"
+# In-flight verify_id_token calls keyed like the cache, shared by concurrent requests
+_firebase_verifications_in_flight: Dict[str, asyncio.Future] = {}
+# Dedicated threads for verify_id_token, so slow Google certificate fetches
+# can't starve the default executor used for audit writes and DB lookups
+_firebase_verify_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="firebase-verify")
+
+# Firebase UID -> pseudonym_id for users already known to exist
+_uid_cache = TTLCache(maxsize=50_000, ttl=300)
+_uid_cache_lock = threading.Lock()
+_AUTH_USER_FIELDS = (
+    "pseudonym_id",
+    "is_active",
+    "is_consented",
+    "consent_version_id",
+    "research_participation_consent",
+    "data_sharing_consent",
+    "preferred_language",
+    "timezone",
+    "engagement_score",
+    "last_login",
+    "created_at",
+)
+# The auth dependencies load only these columns (everything /me and the
+# active/consent checks read), leaving out wide ones like location_point
+AUTH_USER_LOAD = load_only(*(getattr(User, field) for field in _AUTH_USER_FIELDS))
+
 
 class TokenData(BaseModel):
     """Token payload data model."""
@@ -88,14 +137,16 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     """Create a JWT access token."""
     to_encode = data.copy()
     
+    # Integer epoch seconds from a single clock read; jose encodes them as-is
+    issued_at = int(time.time())
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = issued_at + int(expires_delta.total_seconds())
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = issued_at + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
     to_encode.update({
         "exp": expire,
-        "iat": datetime.now(timezone.utc),
+        "iat": issued_at,
         "iss": "mindmap-research-api",
         "aud": "mindmap-client"
     })
@@ -109,22 +160,91 @@ def create_refresh_token(user_id: str) -> str:
     data = {
         "user_id": user_id,
         "token_type": "refresh",
-        "exp": datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        "exp": int(time.time()) + settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
     }
     return jwt.encode(data, settings.SECRET_KEY, algorithm="HS256")
 
 
+async def _verify_id_token_single_flight(cache_key: str, token: str) -> Dict[str, Any]:
+    """
+    Verify a Firebase ID token off the event loop (the SDK is blocking).
+    
+    Concurrent requests carrying the same token await one shared verification
+    instead of each running the RSA check and certificate fetch.
+    """
+    verification = _firebase_verifications_in_flight.get(cache_key)
+    if verification is None:
+        loop = asyncio.get_running_loop()
+        verification = loop.run_in_executor(_firebase_verify_pool, firebase_auth.verify_id_token, token)
+        _firebase_verifications_in_flight[cache_key] = verification
+        verification.add_done_callback(
+            lambda _: _firebase_verifications_in_flight.pop(cache_key, None)
+        )
+    # Shielded so one cancelled request doesn't cancel it for the others
+    return await asyncio.shield(verification)
+
+
+def _cache_firebase_verification(cache_key: str, user_info: Dict[str, Any]):
+    """Keep a verified token's user info in the local cache."""
+    # Never serve a cached entry past the token's own expiration
+    expires_at = time.time() + settings.FIREBASE_TOKEN_CACHE_TTL
+    exp = user_info["token_claims"].get("exp")
+    if exp:
+        expires_at = min(expires_at, exp)
+    with _firebase_token_cache_lock:
+        _firebase_token_cache[cache_key] = (user_info, expires_at)
+
+
+async def _get_shared_firebase_verification(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return user info another worker stored in Redis, or None on a miss or when Redis is unavailable."""
+    if not async_redis_client:
+        return None
+    try:
+        cached = await async_redis_client.get(FIREBASE_TOKEN_REDIS_PREFIX + cache_key)
+    except redis.RedisError as e:
+        logger.warning(f"Firebase token cache read failed: {e}")
+        return None
+    return orjson.loads(cached) if cached else None
+
+
+async def _share_firebase_verification(cache_key: str, user_info: Dict[str, Any]):
+    """Store a verified token's user info in Redis until the token expires."""
+    exp = user_info["token_claims"].get("exp")
+    if not async_redis_client or not exp:
+        return
+    ttl = int(exp - time.time())
+    if ttl <= 0:
+        return
+    try:
+        await async_redis_client.setex(FIREBASE_TOKEN_REDIS_PREFIX + cache_key, ttl, orjson.dumps(user_info))
+    except redis.RedisError as e:
+        logger.warning(f"Firebase token cache write failed: {e}")
+
+
 async def verify_firebase_token(token: str) -> Dict[str, Any]:
-    """Verify Firebase ID token."""
+    """Verify Firebase ID token, reusing a recent verification of the same token."""
     if not _firebase_app and not init_firebase():
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Firebase authentication is not available"
         )
     
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    with _firebase_token_cache_lock:
+        cached = _firebase_token_cache.get(cache_key)
+    if cached is not None:
+        user_info, expires_at = cached
+        if time.time() < expires_at:
+            return user_info
+    
+    # Another worker may already have verified this token
+    user_info = await _get_shared_firebase_verification(cache_key)
+    if user_info is not None:
+        _cache_firebase_verification(cache_key, user_info)
+        return user_info
+    
     try:
-        # Verify the Firebase token
-        decoded_token = firebase_auth.verify_id_token(token)
+        decoded_token = await _verify_id_token_single_flight(cache_key, token)
         
         # Extract user information
         user_info = {
@@ -137,6 +257,9 @@ async def verify_firebase_token(token: str) -> Dict[str, Any]:
             "token_claims": decoded_token
         }
         
+        _cache_firebase_verification(cache_key, user_info)
+        await _share_firebase_verification(cache_key, user_info)
+        
         logger.info(f"Firebase token verified for user: {user_info['firebase_uid']}")
         return user_info
         
@@ -157,8 +280,40 @@ async def verify_firebase_token(token: str) -> Dict[str, Any]:
 
 
 async def verify_jwt_token(token: str) -> TokenData:
-    """Verify JWT access token."""
+    """Verify JWT access token, reusing a recent verification of the same token."""
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    with _jwt_cache_lock:
+        cached = _jwt_cache.get(cache_key)
+    if cached is not None:
+        token_data, expires_at = cached
+        if time.time() < expires_at:
+            return token_data
+    
+    token_data = _decode_jwt_token(token)
+    
+    # Never serve a cached entry past the token's own expiration
+    expires_at = time.time() + settings.JWT_CACHE_TTL
+    if token_data.exp:
+        expires_at = min(expires_at, token_data.exp)
+    with _jwt_cache_lock:
+        _jwt_cache[cache_key] = (token_data, expires_at)
+    
+    return token_data
+
+
+def _decode_jwt_token(token: str) -> TokenData:
+    """Decode and validate a JWT, raising 401 on any failure."""
     try:
+        # Reject expired tokens from the unverified claims before paying for the
+        # signature check; a forged exp can only get a token refused here, and
+        # jwt.decode still verifies exp for everything that gets past
+        exp = jwt.get_unverified_claims(token).get("exp")
+        if isinstance(exp, (int, float)) and exp < time.time():
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has expired"
+            )
+        
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         
         # Validate token structure
@@ -169,15 +324,8 @@ async def verify_jwt_token(token: str) -> TokenData:
                 detail="Invalid token: missing user ID"
             )
         
-        # Check token expiration
-        exp = payload.get("exp")
-        if exp and datetime.fromtimestamp(exp, tz=timezone.utc) < datetime.now(timezone.utc):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has expired"
-            )
-        
-        return TokenData(
+        # Claims come from a verified token; skip re-validating each field
+        return TokenData.model_construct(
             user_id=user_id,
             email=payload.get("email"),
             pseudonym_id=payload.get("pseudonym_id"),
@@ -196,7 +344,14 @@ async def verify_jwt_token(token: str) -> TokenData:
         )
 
 
-async def get_or_create_user(user_info: Dict[str, Any], db) -> User:
+def _remember_firebase_uid(firebase_uid: Optional[str], pseudonym_id: str):
+    """Record which user a Firebase UID maps to."""
+    if firebase_uid:
+        with _uid_cache_lock:
+            _uid_cache[firebase_uid] = pseudonym_id
+
+
+async def get_or_create_user(user_info: Dict[str, Any], db: AsyncSession) -> User:
     """Get existing user or create new user from authentication info."""
     
     # Generate pseudonym for user
@@ -207,16 +362,29 @@ async def get_or_create_user(user_info: Dict[str, Any], db) -> User:
             detail="Unable to identify user from authentication data"
         )
     
+    # Known Firebase users resolve straight to a primary-key lookup
+    firebase_uid = user_info.get("firebase_uid")
+    existing_user = None
+    if firebase_uid:
+        with _uid_cache_lock:
+            cached_pseudonym_id = _uid_cache.get(firebase_uid)
+        if cached_pseudonym_id is not None:
+            existing_user = await db.get(User, cached_pseudonym_id, options=[AUTH_USER_LOAD])
+    
     pseudonym_id = pseudonymizer.pseudonymize_user_id(identifier)
     identifier_hash = pseudonymizer.hash_sensitive_data(identifier)
     
     # Check if user already exists
-    existing_user = db.query(User).filter(User.identifier_hash == identifier_hash).first()
+    if existing_user is None:
+        existing_user = await db.scalar(
+            select(User).options(AUTH_USER_LOAD).where(User.identifier_hash == identifier_hash)
+        )
     
     if existing_user:
         # Update last login
         existing_user.last_login = datetime.now(timezone.utc)
-        db.commit()
+        await db.commit()
+        _remember_firebase_uid(firebase_uid, existing_user.pseudonym_id)
         logger.info(f"Existing user logged in: {existing_user.pseudonym_id}")
         return existing_user
     
@@ -235,11 +403,12 @@ async def get_or_create_user(user_info: Dict[str, Any], db) -> User:
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # Flush so the audit row's user reference exists, then commit both together
+    await db.flush()
     
     # Log user creation
-    audit_log = AuditLog(
+    await insert_audit_log_async(
+        db,
         user_pseudonym_id=pseudonym_id,
         event_type="user_created",
         event_category="authentication",
@@ -251,18 +420,33 @@ async def get_or_create_user(user_info: Dict[str, Any], db) -> User:
             "email_verified": user_info.get("email_verified", False)
         }
     )
-    db.add(audit_log)
-    db.commit()
+    await db.commit()
     
+    _remember_firebase_uid(firebase_uid, new_user.pseudonym_id)
     logger.info(f"New user created: {new_user.pseudonym_id}")
     return new_user
 
 
+def _looks_like_firebase_token(token: str) -> bool:
+    """Firebase ID tokens are RS256 with a key id; our own JWTs are HS256 without one."""
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        return False
+    return header.get("alg") == "RS256" and "kid" in header
+
+
 async def get_current_user(
     request: Request,
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_db_async)
 ) -> AuthenticatedUser:
-    """Get current authenticated user from token."""
+    """
+    Get current authenticated user from token.
+    
+    The loaded User row is kept on request.state.user so the active/consent
+    dependencies check it without another session or query.
+    """
     
     if not credentials:
         raise HTTPException(
@@ -272,31 +456,28 @@ async def get_current_user(
         )
     
     token = credentials.credentials
-    db = SessionLocal()
     
     try:
-        # Try Firebase token first
-        try:
-            firebase_user_info = await verify_firebase_token(token)
-            user = await get_or_create_user(firebase_user_info, db)
-            
-            return AuthenticatedUser(
-                pseudonym_id=user.pseudonym_id,
-                email=firebase_user_info.get("email"),
-                is_verified=firebase_user_info.get("email_verified", False),
-                auth_method="firebase",
-                firebase_uid=firebase_user_info.get("firebase_uid"),
-                permissions=["user"],
-                is_researcher=False,  # Would be determined by role system
-                is_admin=False
-            )
-            
-        except HTTPException as firebase_error:
-            # If Firebase fails, try JWT
-            if firebase_error.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
-                # Firebase not available, try JWT
-                pass
-            else:
+        # Try Firebase token first, unless Firebase is off or the token is one of ours
+        if _firebase_enabled and _looks_like_firebase_token(token):
+            try:
+                firebase_user_info = await verify_firebase_token(token)
+                user = await get_or_create_user(firebase_user_info, db)
+                request.state.user = user
+                request.state.pseudonym_id = user.pseudonym_id
+                
+                return AuthenticatedUser.model_construct(
+                    pseudonym_id=user.pseudonym_id,
+                    email=firebase_user_info.get("email"),
+                    is_verified=firebase_user_info.get("email_verified", False),
+                    auth_method="firebase",
+                    firebase_uid=firebase_user_info.get("firebase_uid"),
+                    permissions=["user"],
+                    is_researcher=False,  # Would be determined by role system
+                    is_admin=False
+                )
+                
+            except HTTPException:
                 # Firebase token was invalid, try JWT as fallback
                 pass
         
@@ -304,14 +485,18 @@ async def get_current_user(
         token_data = await verify_jwt_token(token)
         
         # Get user from database
-        user = db.query(User).filter(User.pseudonym_id == token_data.pseudonym_id).first()
+        user = None
+        if token_data.pseudonym_id:
+            user = await db.get(User, token_data.pseudonym_id, options=[AUTH_USER_LOAD])
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found"
             )
+        request.state.user = user
+        request.state.pseudonym_id = user.pseudonym_id
         
-        return AuthenticatedUser(
+        return AuthenticatedUser.model_construct(
             pseudonym_id=user.pseudonym_id,
             email=token_data.email,
             is_verified=token_data.is_verified,
@@ -329,45 +514,36 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed"
         )
-    finally:
-        db.close()
 
 
 async def get_current_active_user(
+    request: Request,
     current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> AuthenticatedUser:
     """Get current active user (requires user to be active)."""
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if not user or not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User account is inactive"
-            )
-        return current_user
-    finally:
-        db.close()
+    if not request.state.user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User account is inactive"
+        )
+    return current_user
 
 
 async def get_current_consented_user(
+    request: Request,
     current_user: AuthenticatedUser = Depends(get_current_active_user)
 ) -> AuthenticatedUser:
     """Get current user with research consent (required for research endpoints)."""
     if not settings.REQUIRE_CONSENT:
         return current_user
     
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.pseudonym_id == current_user.pseudonym_id).first()
-        if not user or not user.is_consented or not user.research_participation_consent:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Research participation consent required"
-            )
-        return current_user
-    finally:
-        db.close()
+    user = request.state.user
+    if not user.is_consented or not user.research_participation_consent:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Research participation consent required"
+        )
+    return current_user
 
 
 def require_permissions(required_permissions: list[str]):
@@ -392,10 +568,10 @@ def require_permissions(required_permissions: list[str]):
     return decorator
 
 
-def require_researcher_role(
+async def require_researcher_role(
     current_user: AuthenticatedUser = Depends(get_current_active_user)
 ) -> AuthenticatedUser:
-    """Dependency to require researcher role."""
+    """Dependency to require researcher role (async: no threadpool hop per request)."""
     if not current_user.is_researcher:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -404,7 +580,7 @@ def require_researcher_role(
     return current_user
 
 
-def require_admin_role(
+async def require_admin_role(
     current_user: AuthenticatedUser = Depends(get_current_active_user)
 ) -> AuthenticatedUser:
     """Dependency to require admin role."""
@@ -416,5 +592,6 @@ def require_admin_role(
     return current_user
 
 
-# Initialize Firebase on module import
-init_firebase()
\ No newline at end of file
+# Initialize Firebase on module import; when it isn't configured requests
+# go straight to JWT verification
+_firebase_enabled = init_firebase() is not None
\ No newline at end of file
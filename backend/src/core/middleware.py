@@ -13,6 +13,7 @@ from typing import Dict, Any, Optional
 from urllib.parse import urlparse
 
 import redis
+import redis.asyncio
 from fastapi import Request, Response, HTTPException, status
 from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -46,6 +47,18 @@ except Exception as e:
     logger.warning(f"Redis connection failed: {e}. Rate limiting will use in-memory storage.")
     redis_client = None
 
+# Asyncio client for caches used from async handlers, so their round trips
+# don't block the event loop; only created when the connection check passed
+async_redis_client = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    password=settings.REDIS_PASSWORD,
+    db=settings.REDIS_DB,
+    decode_responses=True,
+    socket_connect_timeout=5,
+    socket_timeout=5,
+    retry_on_timeout=True
+) if redis_client else None
+
 # Rate limiter setup
 def get_identifier(request: Request) -> str:
     """Get identifier for rate limiting (IP or user)."""
@@ -76,6 +89,36 @@ else:
     )
 
 
+def get_pseudonym_identifier(request: Request) -> str:
+    """
+    Rate limit key for authenticated routes.
+    
+    Uses the pseudonym recorded by the auth dependency, so users behind a
+    shared NAT or proxy get their own budgets; falls back to the client IP.
+    """
+    pseudonym_id = getattr(request.state, "pseudonym_id", None)
+    if pseudonym_id:
+        return f"user:{pseudonym_id}"
+    return get_remote_address(request)
+
+
+def create_route_limiter(
+    key_func=get_remote_address,
+    strategy: str = "fixed-window-elastic-expiry"
+) -> Limiter:
+    """
+    Create a limiter for router-level @limit decorators (per-IP by default).
+    
+    Counters live in Redis when it is reachable so every worker shares them;
+    otherwise they fall back to in-process memory.
+    """
+    return Limiter(
+        key_func=key_func,
+        storage_uri=settings.REDIS_URL if redis_client else "memory://",
+        strategy=strategy
+    )
+
+
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """Add security headers to all responses."""
     
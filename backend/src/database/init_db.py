@@ -84,15 +84,18 @@ def create_indexes():
         "CREATE INDEX IF NOT EXISTS idx_users_demographics ON users(age_group, gender_identity, race_ethnicity);",
         "CREATE INDEX IF NOT EXISTS idx_users_location ON users USING GIST(location_point);",
         "CREATE INDEX IF NOT EXISTS idx_users_engagement ON users(engagement_score, last_login);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_identifier_hash ON users(identifier_hash);",
         
         # MoodEntry indexes
         "CREATE INDEX IF NOT EXISTS idx_mood_entries_user_date ON mood_entries(user_pseudonym_id, entry_date);",
+        "CREATE INDEX IF NOT EXISTS idx_mood_entries_user_recorded ON mood_entries(user_pseudonym_id, recorded_at DESC);",
         "CREATE INDEX IF NOT EXISTS idx_mood_entries_location ON mood_entries USING GIST(location_point);",
         "CREATE INDEX IF NOT EXISTS idx_mood_entries_mood_score ON mood_entries(mood_score, recorded_at);",
         "CREATE INDEX IF NOT EXISTS idx_mood_entries_quality ON mood_entries(data_quality, is_validated);",
         
         # ResourceRecommendation indexes
-        "CREATE INDEX IF NOT EXISTS idx_recommendations_user_type ON resource_recommendations(user_pseudonym_id, resource_type);",
+        "CREATE INDEX IF NOT EXISTS idx_recommendations_user_recommended ON resource_recommendations(user_pseudonym_id, recommended_at DESC);",
+        "CREATE INDEX IF NOT EXISTS idx_recommendations_user_type_recommended ON resource_recommendations(user_pseudonym_id, resource_type, recommended_at DESC);",
         "CREATE INDEX IF NOT EXISTS idx_recommendations_algorithm ON resource_recommendations(algorithm_type, confidence_score);",
         "CREATE INDEX IF NOT EXISTS idx_recommendations_bias ON resource_recommendations(bias_risk_level) WHERE bias_risk_level != 'low';",
         "CREATE INDEX IF NOT EXISTS idx_recommendations_engagement ON resource_recommendations(status, engagement_score);",
@@ -101,6 +104,7 @@ def create_indexes():
         "CREATE INDEX IF NOT EXISTS idx_interventions_user_type ON intervention_logs(user_pseudonym_id, intervention_type);",
         "CREATE INDEX IF NOT EXISTS idx_interventions_experiment ON intervention_logs(experiment_id, treatment_arm);",
         "CREATE INDEX IF NOT EXISTS idx_interventions_outcome ON intervention_logs(immediate_effectiveness, short_term_effectiveness);",
+        "CREATE INDEX IF NOT EXISTS idx_interventions_user_delivered ON intervention_logs(user_pseudonym_id, delivered_at DESC, log_id DESC);",
         
         # AuditLog indexes
         "CREATE INDEX IF NOT EXISTS idx_audit_user_event ON audit_logs(user_pseudonym_id, event_type, event_timestamp);",
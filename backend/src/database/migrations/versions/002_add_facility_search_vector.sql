@@ -0,0 +1,18 @@
+-- Migration: Add stored full-text search vector for mental health facilities
+-- Date: 2025-01-15
+-- Description: Replaces the on-the-fly to_tsvector expression with a generated column and GIN index
+
+-- Generated tsvector column maintained by PostgreSQL on insert/update
+ALTER TABLE mental_health_facilities
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(description, ''))
+    ) STORED;
+
+-- Create GIN index for full-text search on the stored vector
+CREATE INDEX IF NOT EXISTS idx_facilities_search_vector ON mental_health_facilities USING GIN(search_vector);
+
+-- Expression index superseded by idx_facilities_search_vector
+DROP INDEX IF EXISTS idx_facilities_search;
+
+COMMENT ON COLUMN mental_health_facilities.search_vector IS 'Generated full-text search vector over name and description';
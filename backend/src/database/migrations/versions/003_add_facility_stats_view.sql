@@ -0,0 +1,32 @@
+-- Migration: Add materialized view backing facility statistics
+-- Date: 2025-01-20
+-- Description: Pre-aggregates facility counts so /statistics/overview does not scan mental_health_facilities
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS facility_stats_mv AS
+SELECT
+    state,
+    facility_type,
+    is_active,
+    is_verified,
+    COUNT(*) AS facility_count
+FROM mental_health_facilities
+GROUP BY state, facility_type, is_active, is_verified;
+
+-- Unique index required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_facility_stats_mv_key
+    ON facility_stats_mv(state, facility_type, is_active, is_verified);
+
+-- Refresh every 15 minutes when pg_cron is available; otherwise refresh from an external scheduler
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'refresh-facility-stats-mv',
+            '*/15 * * * *',
+            'REFRESH MATERIALIZED VIEW CONCURRENTLY facility_stats_mv'
+        );
+    END IF;
+END
+$$;
+
+COMMENT ON MATERIALIZED VIEW facility_stats_mv IS 'Facility counts by state, type, active and verified status (refreshed every 15 minutes)';
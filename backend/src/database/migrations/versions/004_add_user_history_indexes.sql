@@ -0,0 +1,15 @@
+-- Migration: Add composite indexes for per-user mood and recommendation history
+-- Date: 2025-01-27
+-- Description: Lets the newest-first list endpoints read rows in index order instead of sorting
+
+-- /mood/entries: WHERE user_pseudonym_id = ? ORDER BY recorded_at DESC
+CREATE INDEX IF NOT EXISTS idx_mood_entries_user_recorded ON mood_entries(user_pseudonym_id, recorded_at DESC);
+
+-- /recommendations without a resource_type filter
+CREATE INDEX IF NOT EXISTS idx_recommendations_user_recommended ON resource_recommendations(user_pseudonym_id, recommended_at DESC);
+
+-- /recommendations?resource_type=...; covers the (user_pseudonym_id, resource_type) prefix as well
+CREATE INDEX IF NOT EXISTS idx_recommendations_user_type_recommended ON resource_recommendations(user_pseudonym_id, resource_type, recommended_at DESC);
+
+-- Prefix of idx_recommendations_user_type_recommended
+DROP INDEX IF EXISTS idx_recommendations_user_type;
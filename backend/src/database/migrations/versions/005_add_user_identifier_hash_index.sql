@@ -0,0 +1,6 @@
+-- Migration: Add unique index on users.identifier_hash
+-- Date: 2025-01-27
+-- Description: Login resolves existing users by identifier_hash; make that an index lookup and keep it one row per identity
+
+-- get_or_create_user: WHERE identifier_hash = ?
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_identifier_hash ON users(identifier_hash);
@@ -3,12 +3,17 @@ Database queries for mental health facilities with PostGIS spatial operations.
 Provides async functions for facility search and location-based queries.
 """
 
-from sqlalchemy import and_, or_, func, text, select
-from sqlalchemy.orm import Session
+from sqlalchemy import Column, Computed, Float, Integer, String, and_, or_, bindparam, cast, func, text, select
+from sqlalchemy.dialects.postgresql import ARRAY, TEXT, TSVECTOR, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import deferred, raiseload
 from geoalchemy2 import Geography
 from geoalchemy2.functions import ST_DWithin, ST_Distance, ST_GeogFromText, ST_AsText
-from typing import List, Optional, Dict, Any, Tuple
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 import logging
+import math
+from functools import lru_cache
+from datetime import datetime, timezone
 
 from ..models.mental_health_facility import MentalHealthFacility
 from ...schemas.mental_health_facility import (
@@ -20,17 +25,204 @@ from ...schemas.mental_health_facility import (
 
 logger = logging.getLogger(__name__)
 
+# Miles per degree of latitude, and the largest radius worth a bounding-box prefilter
+MILES_PER_DEGREE_LATITUDE = 69.0
+BBOX_PREFILTER_MAX_RADIUS_MILES = 100.0
+# Geography envelope edges are great-circle arcs, so pad the box to never clip the radius
+BBOX_PADDING_FACTOR = 1.1
 
-async def insert_facility(db: Session, facility_data: FacilityCreate) -> MentalHealthFacility:
+# Generated column added in migration 002 (name + description, english config).
+# Mapped on MentalHealthFacility, deferred so facility rows never carry the
+# tsvector; declared here only if the model doesn't already map it
+if 'search_vector' not in MentalHealthFacility.__mapper__.attrs:
+    MentalHealthFacility.search_vector = deferred(Column(
+        'search_vector',
+        TSVECTOR,
+        Computed(
+            "to_tsvector('english', COALESCE(name, '') || ' ' || COALESCE(description, ''))",
+            persisted=True
+        )
+    ))
+
+# Pre-aggregated counts from migration 003
+FACILITY_STATS_QUERY = text(
+    "SELECT state, facility_type, is_active, is_verified, facility_count FROM facility_stats_mv"
+)
+
+# Services, payment types and languages are array columns loaded with the row;
+# forbid lazy loads so list serialization can never fan out into N+1 queries
+FACILITY_LIST_LOAD_OPTIONS = (raiseload('*'),)
+
+
+def radius_bounding_box(
+    latitude: float,
+    longitude: float,
+    radius_miles: float
+) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Compute a (min_lon, min_lat, max_lon, max_lat) box enclosing a search radius.
+    
+    Returns None when a box would not be a valid prefilter: radius too large,
+    or the box would cross a pole or the antimeridian.
+    """
+    if radius_miles > BBOX_PREFILTER_MAX_RADIUS_MILES:
+        return None
+    
+    padded_miles = radius_miles * BBOX_PADDING_FACTOR
+    dlat = padded_miles / MILES_PER_DEGREE_LATITUDE
+    min_lat, max_lat = latitude - dlat, latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return None
+    
+    dlon = padded_miles / (MILES_PER_DEGREE_LATITUDE * math.cos(math.radians(latitude)))
+    min_lon, max_lon = longitude - dlon, longitude + dlon
+    if min_lon <= -180 or max_lon >= 180:
+        return None
+    
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _geography_point(latitude, longitude):
+    """Build a geography point (SRID 4326) from coordinate values or bind parameters."""
+    return cast(
+        func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326),
+        Geography(srid=4326)
+    )
+
+
+def _array_contains(column, param_name: str):
+    """
+    Require every value of a text[] bind parameter to be present in the column (column @> :param).
+    
+    Matching is exact and case-sensitive so the GIN index on the array column applies;
+    the facility endpoints document this contract on their filter parameters.
+    """
+    return column.op('@>')(bindparam(param_name, type_=ARRAY(TEXT)))
+
+
+@lru_cache(maxsize=64)
+def _nearby_statement(
+    use_bbox: bool,
+    has_facility_type: bool,
+    only_verified: bool,
+    has_services: bool,
+    has_payment_types: bool,
+    has_languages: bool
+):
+    """
+    Build the nearby-search statement for one combination of optional filters.
+    
+    Values are bind parameters, so each shape is constructed once and reused
+    (which also keeps SQLAlchemy's compiled cache and asyncpg's prepared statements warm).
+    """
+    # Search point cast to geography so ST_DWithin and KNN can use the GiST index on location
+    search_point = _geography_point(
+        bindparam('latitude', type_=Float),
+        bindparam('longitude', type_=Float)
+    )
+    
+    # Base query with distance calculation
+    query = select(
+        MentalHealthFacility,
+        func.ST_Distance(MentalHealthFacility.location, search_point).label('distance_meters')
+    ).options(*FACILITY_LIST_LOAD_OPTIONS).where(
+        and_(
+            MentalHealthFacility.is_active == True,
+            MentalHealthFacility.location.isnot(None),
+            func.ST_DWithin(
+                MentalHealthFacility.location,
+                search_point,
+                bindparam('radius_meters', type_=Float)
+            )
+        )
+    )
+    
+    # Cheap GiST bounding-box overlap before the exact radius check
+    if use_bbox:
+        envelope = cast(
+            func.ST_MakeEnvelope(
+                bindparam('min_lon', type_=Float),
+                bindparam('min_lat', type_=Float),
+                bindparam('max_lon', type_=Float),
+                bindparam('max_lat', type_=Float),
+                4326
+            ),
+            Geography(srid=4326)
+        )
+        query = query.where(MentalHealthFacility.location.op('&&')(envelope))
+    
+    if has_facility_type:
+        query = query.where(MentalHealthFacility.facility_type == bindparam('facility_type'))
+    
+    if only_verified:
+        query = query.where(MentalHealthFacility.is_verified == True)
+    
+    # Array containment filters, answered by the GIN indexes on the array columns
+    if has_services:
+        query = query.where(_array_contains(MentalHealthFacility.services, 'services'))
+    
+    if has_payment_types:
+        query = query.where(_array_contains(MentalHealthFacility.payment_types, 'payment_types'))
+    
+    if has_languages:
+        query = query.where(_array_contains(MentalHealthFacility.languages_spoken, 'languages'))
+    
+    # KNN ordering by distance and limit results
+    return query.order_by(
+        MentalHealthFacility.location.op('<->')(search_point)
+    ).limit(bindparam('limit', type_=Integer))
+
+
+@lru_cache(maxsize=32)
+def _search_statement(
+    only_active: bool,
+    has_state: bool,
+    has_city: bool,
+    has_facility_type: bool,
+    has_services: bool
+):
+    """Build the full-text search statement for one combination of optional filters."""
+    # Full-text search against the stored, GIN-indexed tsvector column
+    query_tsquery = func.plainto_tsquery('english', bindparam('query_text', type_=String))
+    
+    query = select(MentalHealthFacility).options(*FACILITY_LIST_LOAD_OPTIONS).where(
+        MentalHealthFacility.search_vector.op('@@')(query_tsquery)
+    )
+    
+    if only_active:
+        query = query.where(MentalHealthFacility.is_active == True)
+    
+    if has_state:
+        query = query.where(MentalHealthFacility.state == bindparam('state'))
+    
+    if has_city:
+        query = query.where(MentalHealthFacility.city.ilike(bindparam('city_pattern')))
+    
+    if has_facility_type:
+        query = query.where(MentalHealthFacility.facility_type == bindparam('facility_type'))
+    
+    if has_services:
+        query = query.where(_array_contains(MentalHealthFacility.services, 'services'))
+    
+    # Order by search rank and limit
+    return query.order_by(
+        func.ts_rank_cd(MentalHealthFacility.search_vector, query_tsquery).desc()
+    ).limit(bindparam('limit', type_=Integer))
+
+
+async def insert_facility(db: AsyncSession, facility_data: FacilityCreate) -> Optional[MentalHealthFacility]:
     """
     Insert a new mental health facility with spatial data.
     
+    Uses a single INSERT ... ON CONFLICT (facility_id) DO NOTHING RETURNING
+    statement, so the existence check and insert happen atomically.
+    
     Args:
         db: Database session
         facility_data: Facility creation data
     
     Returns:
-        Created facility record
+        Created facility record, or None if the facility ID already exists
     
     Raises:
         Exception: If facility creation fails
@@ -39,12 +231,10 @@ async def insert_facility(db: Session, facility_data: FacilityCreate) -> MentalH
         # Create location point from coordinates if provided
         location_point = None
         if facility_data.latitude is not None and facility_data.longitude is not None:
-            location_point = func.ST_GeogFromText(
-                f'POINT({facility_data.longitude} {facility_data.latitude})'
-            )
+            location_point = _geography_point(facility_data.latitude, facility_data.longitude)
         
-        # Create facility record
-        facility = MentalHealthFacility(
+        now = datetime.now(timezone.utc)
+        stmt = pg_insert(MentalHealthFacility).values(
             facility_id=facility_data.facility_id,
             name=facility_data.name,
             address=facility_data.address,
@@ -66,23 +256,30 @@ async def insert_facility(db: Session, facility_data: FacilityCreate) -> MentalH
             contact_person=facility_data.contact_person,
             data_source=facility_data.data_source,
             is_active=True,
-            is_verified=False
-        )
-        
-        db.add(facility)
-        db.commit()
-        db.refresh(facility)
+            is_verified=False,
+            created_at=now,
+            updated_at=now
+        ).on_conflict_do_nothing(
+            index_elements=['facility_id']
+        ).returning(MentalHealthFacility)
+        
+        facility = (await db.execute(stmt)).scalars().first()
+        await db.commit()
+        
+        if facility is None:
+            logger.warning(f"Facility already exists: {facility_data.facility_id}")
+            return None
         
         logger.info(f"Inserted facility: {facility.name} (ID: {facility.facility_id})")
         return facility
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Failed to insert facility {facility_data.facility_id}: {e}")
         raise
 
 
-async def update_facility(db: Session, facility_id: str, update_data: FacilityUpdate) -> Optional[MentalHealthFacility]:
+async def update_facility(db: AsyncSession, facility_id: str, update_data: FacilityUpdate) -> Optional[MentalHealthFacility]:
     """
     Update an existing mental health facility.
     
@@ -95,9 +292,9 @@ async def update_facility(db: Session, facility_id: str, update_data: FacilityUp
         Updated facility record or None if not found
     """
     try:
-        facility = db.query(MentalHealthFacility).filter(
-            MentalHealthFacility.facility_id == facility_id
-        ).first()
+        facility = (await db.execute(
+            select(MentalHealthFacility).where(MentalHealthFacility.facility_id == facility_id)
+        )).scalars().first()
         
         if not facility:
             logger.warning(f"Facility not found for update: {facility_id}")
@@ -110,27 +307,27 @@ async def update_facility(db: Session, facility_id: str, update_data: FacilityUp
         if 'latitude' in update_dict and 'longitude' in update_dict:
             lat, lng = update_dict.pop('latitude'), update_dict.pop('longitude')
             if lat is not None and lng is not None:
-                facility.location = func.ST_GeogFromText(f'POINT({lng} {lat})')
+                facility.location = _geography_point(lat, lng)
         
         # Update other fields
         for field, value in update_dict.items():
             if hasattr(facility, field):
                 setattr(facility, field, value)
         
-        db.commit()
-        db.refresh(facility)
+        await db.commit()
+        await db.refresh(facility)
         
         logger.info(f"Updated facility: {facility.name} (ID: {facility.facility_id})")
         return facility
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Failed to update facility {facility_id}: {e}")
         raise
 
 
 async def get_nearby_facilities(
-    db: Session, 
+    db: AsyncSession,
     latitude: float, 
     longitude: float, 
     radius_miles: float = 10.0,
@@ -161,58 +358,39 @@ async def get_nearby_facilities(
     """
     try:
         # Convert miles to meters for PostGIS (1 mile = 1609.344 meters)
-        radius_meters = radius_miles * 1609.344
-        
-        # Create search point
-        search_point = func.ST_GeogFromText(f'POINT({longitude} {latitude})')
-        
-        # Base query with distance calculation
-        query = db.query(
-            MentalHealthFacility,
-            func.ST_Distance(MentalHealthFacility.location, search_point).label('distance_meters')
-        ).filter(
-            and_(
-                MentalHealthFacility.is_active == True,
-                MentalHealthFacility.location.isnot(None),
-                func.ST_DWithin(MentalHealthFacility.location, search_point, radius_meters)
-            )
-        )
+        params: Dict[str, Any] = {
+            'latitude': latitude,
+            'longitude': longitude,
+            'radius_meters': radius_miles * 1609.344,
+            'limit': limit
+        }
         
-        # Apply filters
+        bbox = radius_bounding_box(latitude, longitude, radius_miles)
+        if bbox:
+            params.update(zip(('min_lon', 'min_lat', 'max_lon', 'max_lat'), bbox))
         if facility_type:
-            query = query.filter(MentalHealthFacility.facility_type == facility_type)
-        
-        if only_verified:
-            query = query.filter(MentalHealthFacility.is_verified == True)
-        
-        # Array filters using PostGIS array operations
+            params['facility_type'] = facility_type
         if services:
-            for service in services:
-                query = query.filter(
-                    func.array_to_string(MentalHealthFacility.services, '||').ilike(f'%{service}%')
-                )
-        
+            params['services'] = services
         if payment_types:
-            for payment_type in payment_types:
-                query = query.filter(
-                    func.array_to_string(MentalHealthFacility.payment_types, '||').ilike(f'%{payment_type}%')
-                )
-        
+            params['payment_types'] = payment_types
         if languages:
-            for language in languages:
-                query = query.filter(
-                    func.array_to_string(MentalHealthFacility.languages_spoken, '||').ilike(f'%{language}%')
-                )
-        
-        # Order by distance and limit results
-        query = query.order_by(text('distance_meters')).limit(limit)
-        
-        results = query.all()
+            params['languages'] = languages
+        
+        query = _nearby_statement(
+            bool(bbox),
+            bool(facility_type),
+            only_verified,
+            bool(services),
+            bool(payment_types),
+            bool(languages)
+        )
+        results = (await db.execute(query, params)).all()
         
         # Add distance in miles to each facility
         facilities = []
         for facility, distance_meters in results:
-            distance_miles = distance_meters / 1609.344 if distance_meters else None
+            distance_miles = distance_meters / 1609.344 if distance_meters is not None else None
             facility.distance_miles = distance_miles
             facilities.append(facility)
         
@@ -225,7 +403,7 @@ async def get_nearby_facilities(
 
 
 async def search_facilities(
-    db: Session,
+    db: AsyncSession,
     query_text: str,
     state: Optional[str] = None,
     city: Optional[str] = None,
@@ -240,7 +418,7 @@ async def search_facilities(
     Args:
         db: Database session
         query_text: Search query
-        state: Filter by state
+        state: Filter by upper-case state abbreviation
         city: Filter by city
         facility_type: Filter by facility type
         services: Filter by services
@@ -251,44 +429,24 @@ async def search_facilities(
         List of matching facilities
     """
     try:
-        # Full-text search using PostgreSQL tsvector
-        search_vector = func.to_tsvector('english', 
-            func.coalesce(MentalHealthFacility.name, '') + ' ' +
-            func.coalesce(MentalHealthFacility.description, '')
-        )
-        
-        query_tsquery = func.plainto_tsquery('english', query_text)
-        
-        # Base query with full-text search
-        query = db.query(MentalHealthFacility).filter(
-            search_vector.match(query_tsquery)
-        )
-        
-        # Apply filters
-        if only_active:
-            query = query.filter(MentalHealthFacility.is_active == True)
-        
+        params: Dict[str, Any] = {'query_text': query_text, 'limit': limit}
         if state:
-            query = query.filter(MentalHealthFacility.state == state.upper())
-        
+            params['state'] = state
         if city:
-            query = query.filter(MentalHealthFacility.city.ilike(f'%{city}%'))
-        
+            params['city_pattern'] = f'%{city}%'
         if facility_type:
-            query = query.filter(MentalHealthFacility.facility_type == facility_type)
-        
+            params['facility_type'] = facility_type
         if services:
-            for service in services:
-                query = query.filter(
-                    func.array_to_string(MentalHealthFacility.services, '||').ilike(f'%{service}%')
-                )
-        
-        # Order by search rank and limit
-        query = query.order_by(
-            func.ts_rank(search_vector, query_tsquery).desc()
-        ).limit(limit)
-        
-        facilities = query.all()
+            params['services'] = services
+        
+        query = _search_statement(
+            only_active,
+            bool(state),
+            bool(city),
+            bool(facility_type),
+            bool(services)
+        )
+        facilities = (await db.execute(query, params)).scalars().all()
         
         logger.info(f"Found {len(facilities)} facilities matching '{query_text}'")
         return facilities
@@ -298,7 +456,7 @@ async def search_facilities(
         raise
 
 
-async def get_facility_by_id(db: Session, facility_id: str) -> Optional[MentalHealthFacility]:
+async def get_facility_by_id(db: AsyncSession, facility_id: str) -> Optional[MentalHealthFacility]:
     """
     Get a specific facility by ID.
     
@@ -310,9 +468,9 @@ async def get_facility_by_id(db: Session, facility_id: str) -> Optional[MentalHe
         Facility record or None if not found
     """
     try:
-        facility = db.query(MentalHealthFacility).filter(
-            MentalHealthFacility.facility_id == facility_id
-        ).first()
+        facility = (await db.execute(
+            select(MentalHealthFacility).where(MentalHealthFacility.facility_id == facility_id)
+        )).scalars().first()
         
         if facility:
             logger.info(f"Retrieved facility: {facility.name} (ID: {facility_id})")
@@ -326,38 +484,41 @@ async def get_facility_by_id(db: Session, facility_id: str) -> Optional[MentalHe
         raise
 
 
-async def get_facilities_by_state(db: Session, state: str, limit: int = 100) -> List[MentalHealthFacility]:
+async def stream_facilities_by_state(
+    db: AsyncSession,
+    state: str,
+    limit: int = 100
+) -> AsyncIterator[MentalHealthFacility]:
     """
-    Get all facilities in a specific state.
+    Stream active facilities in a state, ordered by name, from a server-side cursor.
     
     Args:
-        db: Database session
-        state: State abbreviation
+        db: Database session (must stay open while the iterator is consumed)
+        state: Upper-case state abbreviation
         limit: Maximum number of results
     
-    Returns:
-        List of facilities in the state
+    Yields:
+        Facility records one at a time
     """
-    try:
-        facilities = db.query(MentalHealthFacility).filter(
+    facilities = await db.stream_scalars(
+        select(MentalHealthFacility).options(*FACILITY_LIST_LOAD_OPTIONS).where(
             and_(
-                MentalHealthFacility.state == state.upper(),
+                MentalHealthFacility.state == state,
                 MentalHealthFacility.is_active == True
             )
-        ).limit(limit).all()
-        
-        logger.info(f"Found {len(facilities)} facilities in {state.upper()}")
-        return facilities
-        
-    except Exception as e:
-        logger.error(f"Failed to get facilities for state {state}: {e}")
-        raise
+        ).order_by(MentalHealthFacility.name).limit(limit)
+    )
+    async for facility in facilities:
+        yield facility
 
 
-async def get_facility_statistics(db: Session) -> Dict[str, Any]:
+async def get_facility_statistics(db: AsyncSession) -> Dict[str, Any]:
     """
     Get comprehensive statistics about facilities in the database.
     
+    Reads the pre-aggregated facility_stats_mv materialized view (migration 003)
+    and pivots it in Python, so the cost is independent of the facilities table size.
+    
     Args:
         db: Database session
     
@@ -365,37 +526,26 @@ async def get_facility_statistics(db: Session) -> Dict[str, Any]:
         Dictionary with facility statistics
     """
     try:
-        # Basic counts
-        total_facilities = db.query(func.count(MentalHealthFacility.facility_id)).scalar()
-        active_facilities = db.query(func.count(MentalHealthFacility.facility_id)).filter(
-            MentalHealthFacility.is_active == True
-        ).scalar()
-        verified_facilities = db.query(func.count(MentalHealthFacility.facility_id)).filter(
-            MentalHealthFacility.is_verified == True
-        ).scalar()
-        
-        # By state
-        by_state = db.query(
-            MentalHealthFacility.state,
-            func.count(MentalHealthFacility.facility_id).label('count')
-        ).filter(
-            MentalHealthFacility.is_active == True
-        ).group_by(MentalHealthFacility.state).all()
-        
-        # By facility type
-        by_type = db.query(
-            MentalHealthFacility.facility_type,
-            func.count(MentalHealthFacility.facility_id).label('count')
-        ).filter(
-            MentalHealthFacility.is_active == True
-        ).group_by(MentalHealthFacility.facility_type).all()
+        rows = (await db.execute(FACILITY_STATS_QUERY)).all()
+        
+        total_facilities = active_facilities = verified_facilities = 0
+        by_state: Dict[Optional[str], int] = {}
+        by_type: Dict[Optional[str], int] = {}
+        for state, facility_type, is_active, is_verified, count in rows:
+            total_facilities += count
+            if is_verified:
+                verified_facilities += count
+            if is_active:
+                active_facilities += count
+                by_state[state] = by_state.get(state, 0) + count
+                by_type[facility_type] = by_type.get(facility_type, 0) + count
         
         stats = {
             'total_facilities': total_facilities,
             'active_facilities': active_facilities,
             'verified_facilities': verified_facilities,
-            'facilities_by_state': [{'state': state, 'count': count} for state, count in by_state],
-            'facilities_by_type': [{'type': ftype, 'count': count} for ftype, count in by_type]
+            'facilities_by_state': [{'state': state, 'count': count} for state, count in by_state.items()],
+            'facilities_by_type': [{'type': ftype, 'count': count} for ftype, count in by_type.items()]
         }
         
         logger.info(f"Generated facility statistics: {total_facilities} total facilities")
@@ -403,4 +553,17 @@ async def get_facility_statistics(db: Session) -> Dict[str, Any]:
         
     except Exception as e:
         logger.error(f"Failed to get facility statistics: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+async def refresh_facility_statistics(db: AsyncSession) -> None:
+    """Refresh facility_stats_mv without blocking readers (for schedulers without pg_cron)."""
+    try:
+        await db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY facility_stats_mv"))
+        await db.commit()
+        logger.info("Refreshed facility statistics materialized view")
+        
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to refresh facility statistics: {e}")
+        raise
@@ -23,10 +23,12 @@ from core.middleware import (
     LoggingMiddleware,
     PseudonymizationMiddleware,
     RateLimitingMiddleware,
-    SecurityHeadersMiddleware
+    SecurityHeadersMiddleware,
+    setup_rate_limiting
 )
 from core.exceptions import setup_exception_handlers
-from database.base import engine, init_database
+from core.audit_queue import start_audit_writer, stop_audit_writer
+from database.base import async_engine, engine, get_postgis_version, init_database
 
 # Configure logging
 logging.basicConfig(
@@ -50,14 +52,21 @@ async def lifespan(app: FastAPI):
         logger.error(f"Database initialization failed: {e}")
         raise
     
+    # Probe PostGIS once so health checks don't call into it on every request
+    app.state.postgis_version = await get_postgis_version()
+    logger.info(f"PostGIS version: {app.state.postgis_version or 'unavailable'}")
+    
     # Additional startup logic
+    start_audit_writer()
     logger.info("API startup complete")
     
     yield
     
     # Shutdown
     logger.info("Shutting down MindMap Research API...")
+    await stop_audit_writer()
     engine.dispose()
+    await async_engine.dispose()
     logger.info("Database connections closed")
 
 
@@ -117,7 +126,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["X-Request-ID", "X-Rate-Limit-Remaining"]
+    expose_headers=["X-Request-ID", "X-Rate-Limit-Remaining", "X-Next-Cursor"]
 )
 
 # Custom middleware
@@ -128,6 +137,9 @@ app.add_middleware(LoggingMiddleware)
 # Set up exception handlers
 setup_exception_handlers(app)
 
+# Register the limiter and its 429 handler for router-level @limit decorators
+setup_rate_limiting(app)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
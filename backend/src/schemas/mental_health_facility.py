@@ -3,11 +3,28 @@ Pydantic schemas for Mental Health Facility API endpoints.
 Handles validation and serialization for SAMHSA facility data.
 """
 
-from pydantic import BaseModel, validator, Field
-from typing import List, Optional, Dict, Any, Tuple
+from geoalchemy2.shape import to_shape
+from pydantic import BaseModel, BeforeValidator, ConfigDict, StringConstraints, TypeAdapter, model_validator, validator, Field
+from typing import Annotated, List, Optional, Dict, Any, Tuple, Union
 from datetime import datetime
 
 
+def split_csv(value: Union[str, List[str], None]) -> Optional[List[str]]:
+    """Split comma-separated query values ("a,b" or repeated params) into a trimmed list."""
+    if not value:
+        return None
+    raw = value.split(',') if isinstance(value, str) else [part for item in value for part in item.split(',')]
+    return [item.strip() for item in raw if item.strip()] or None
+
+
+# Query parameter type accepting comma-separated values, e.g. ?services=a,b.
+# Facility list filters match each value exactly (array containment), not by substring
+CsvList = Annotated[Optional[List[str]], BeforeValidator(split_csv)]
+
+# Two-letter state abbreviation, validated and upper-cased before the handler runs
+StateAbbrev = Annotated[str, StringConstraints(to_upper=True, pattern=r'^[A-Za-z]{2}$')]
+
+
 class FacilityBase(BaseModel):
     """Base model for facility data."""
     name: str = Field(..., min_length=1, max_length=255, description="Facility name")
@@ -110,8 +127,34 @@ class FacilityResponse(FacilityBase):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(extra='ignore', from_attributes=True, validate_assignment=False)
+    
+    @model_validator(mode='before')
+    @classmethod
+    def derive_location_fields(cls, data: Any) -> Any:
+        """Fill the fields to_dict() used to compute when validating straight from an ORM row."""
+        if isinstance(data, dict):
+            return data
+        
+        values = {name: getattr(data, name) for name in cls.model_fields if hasattr(data, name)}
+        
+        location = getattr(data, 'location', None)
+        if values.get('latitude') is None and location is not None:
+            point = to_shape(location)
+            values['latitude'], values['longitude'] = point.y, point.x
+        if values.get('coordinates') is None and values.get('latitude') is not None:
+            values['coordinates'] = (values['latitude'], values['longitude'])
+        
+        if values.get('full_address') is None:
+            state_zip = ' '.join(part for part in (values.get('state'), values.get('zip_code')) if part)
+            parts = [part for part in (values.get('address'), values.get('city'), state_zip) if part]
+            values['full_address'] = ', '.join(parts) or None
+        
+        return values
+
+
+# Built once at import so list endpoints validate ORM rows in a single core call
+facility_list_adapter = TypeAdapter(List[FacilityResponse])
 
 
 class NearbyFacilitiesRequest(BaseModel):
@@ -120,9 +163,9 @@ class NearbyFacilitiesRequest(BaseModel):
     longitude: float = Field(..., ge=-180, le=180, description="Search center longitude")
     radius_miles: float = Field(default=10.0, ge=0.1, le=100.0, description="Search radius in miles")
     facility_type: Optional[str] = Field(None, description="Filter by facility type")
-    services: Optional[List[str]] = Field(None, description="Filter by services")
-    payment_types: Optional[List[str]] = Field(None, description="Filter by payment types")
-    languages: Optional[List[str]] = Field(None, description="Filter by languages spoken")
+    services: Optional[List[str]] = Field(None, description="Filter by services (exact, case-sensitive; all must match)")
+    payment_types: Optional[List[str]] = Field(None, description="Filter by payment types (exact, case-sensitive; all must match)")
+    languages: Optional[List[str]] = Field(None, description="Filter by languages spoken (exact, case-sensitive; all must match)")
     limit: int = Field(default=50, ge=1, le=100, description="Maximum number of results")
     only_verified: bool = Field(default=False, description="Only return verified facilities")
     
@@ -139,7 +182,7 @@ class FacilitySearchRequest(BaseModel):
     state: Optional[str] = Field(None, min_length=2, max_length=2, description="Filter by state")
     city: Optional[str] = Field(None, max_length=100, description="Filter by city")
     facility_type: Optional[str] = Field(None, description="Filter by facility type")
-    services: Optional[List[str]] = Field(None, description="Filter by services")
+    services: Optional[List[str]] = Field(None, description="Filter by services (exact, case-sensitive; all must match)")
     limit: int = Field(default=50, ge=1, le=100, description="Maximum number of results")
     only_active: bool = Field(default=True, description="Only return active facilities")
     
@@ -155,6 +198,8 @@ class FacilitiesResponse(BaseModel):
     search_center: Optional[Dict[str, float]] = None
     search_radius_miles: Optional[float] = None
     filters_applied: Dict[str, Any] = {}
+    
+    model_config = ConfigDict(extra='ignore', validate_assignment=False)
 
 
 class FacilityImportStats(BaseModel):
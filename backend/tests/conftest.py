@@ -0,0 +1,9 @@
+"""
+Shared pytest configuration for the MindMap Research API tests.
+Puts backend/src on the import path so tests import modules as the app does.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,62 @@
+"""
+Unit tests for facility response serialization from ORM rows.
+"""
+
+import json
+from types import SimpleNamespace
+
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+
+from schemas.mental_health_facility import FacilityResponse, facility_list_adapter
+
+
+def make_facility_row(**overrides):
+    """Stand-in for a MentalHealthFacility row: plain attributes plus a geography value."""
+    row = dict(
+        facility_id="FAC-001",
+        name="Bay Area Counseling Center",
+        address="100 Market St",
+        city="San Francisco",
+        state="CA",
+        zip_code="94105",
+        data_source="SAMHSA",
+        location=from_shape(Point(-122.3965, 37.7937), srid=4326),
+        distance_miles=1.25,
+    )
+    row.update(overrides)
+    return SimpleNamespace(**row)
+
+
+class TestFacilityResponseFromOrm:
+
+    def test_coordinates_derived_from_location(self):
+        facility = FacilityResponse.model_validate(make_facility_row())
+
+        assert facility.latitude == 37.7937
+        assert facility.longitude == -122.3965
+        assert facility.coordinates == (37.7937, -122.3965)
+        assert facility.distance_miles == 1.25
+
+    def test_full_address_assembled(self):
+        facility = FacilityResponse.model_validate(make_facility_row())
+
+        assert facility.full_address == "100 Market St, San Francisco, CA 94105"
+
+    def test_coordinates_survive_list_serialization(self):
+        facilities = facility_list_adapter.validate_python(
+            [make_facility_row()], from_attributes=True
+        )
+        payload = json.loads(facility_list_adapter.dump_json(facilities))
+
+        assert payload[0]["latitude"] == 37.7937
+        assert payload[0]["longitude"] == -122.3965
+        assert payload[0]["coordinates"] == [37.7937, -122.3965]
+        assert payload[0]["full_address"] == "100 Market St, San Francisco, CA 94105"
+
+    def test_row_without_location(self):
+        facility = FacilityResponse.model_validate(make_facility_row(location=None, address=None))
+
+        assert facility.latitude is None
+        assert facility.coordinates is None
+        assert facility.full_address == "San Francisco, CA 94105"